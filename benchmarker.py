@@ -1,22 +1,39 @@
 #!/usr/bin/env python3
 import json
+import math
 import os
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from enum import Enum
-from typing import Any, Dict, Optional, List, Tuple
+from typing import Any, Dict, Iterable, Optional, List, Tuple
 import random
+import threading
 import click
-import urllib3
 from tabulate import tabulate
 
+from serverlessbench.analysis import decompose_cold_starts, format_cold_start_decomposition, format_summary, \
+    samples_from_files, summarize
 from serverlessbench.aws import AWS
 from serverlessbench.azure import Azure
+from serverlessbench.coldstart import MAX_ATTEMPTS, ColdStartPipeline, ColdStartStats, IdleTimeoutStrategy, \
+    RedeployStrategy, load_eviction_windows, save_eviction_windows
+from serverlessbench.enrichment import EnrichmentPipeline
 from serverlessbench.gcp import GCP
+from serverlessbench.histogram import LatencyHistogram, save_histogram
+from serverlessbench.invoker import FunctionInvocationResult, create_invoker
 from serverlessbench.knative import Knative
+from serverlessbench.lifecycle import LifecycleTracker
 from serverlessbench.logger import LoggingBase
+from serverlessbench.manifest import RUNS_DIR, RunManifest, TargetKey, get_manifest_path
+from serverlessbench.results import ResultWriter, read_results, truncate_results
+from serverlessbench.store import ResultStore
+from serverlessbench.workers import MultiProcessInvoker
 from serverlessbench.utils import load_config, load_deployments, get_benchmark_names, get_runtime_names
 
+PROVIDERS = ['aws', 'azure', 'gcp', 'knative']
+
 
 class LoadProfile(Enum):
     COLD = "cold"
@@ -24,26 +41,14 @@ class LoadProfile(Enum):
     BURST = "burst"
 
 
-class FunctionInvocationResult:
-    def __init__(self, request_id: str, client_begin: int, client_end: int, client_time: float,
-                 response_body: dict | str | None):
-        self.request_id = request_id
-        self.provider_time = None  # Will be set later
-        self.client_begin = client_begin
-        self.client_end = client_end
-        self.client_time = client_time
-        self.response_body = response_body
-
-    def toJSON(self):
-        return json.dumps(
-            self,
-            default=lambda o: o.__dict__,
-            sort_keys=True,
-            indent=4)
+class ArrivalPattern(Enum):
+    BURST = "burst"  # K simultaneous requests every interval
+    POISSON = "poisson"  # Exponentially distributed inter-arrival times at a mean rate
+    STEP = "step"  # Evenly spaced requests, the rate grows by one step every interval
 
 
 class Benchmarker(LoggingBase):
-    def __init__(self):
+    def __init__(self, max_connections: int = 1, engine: str = 'sync', workers: int = 1):
         super().__init__()
 
         self.aws = AWS()
@@ -51,11 +56,28 @@ class Benchmarker(LoggingBase):
         self.gcp = GCP()
         self.knative = Knative()
 
+        # Provider times are back-filled into the written result files in the background
+        self.enrichment = EnrichmentPipeline({'gcp': self.gcp, 'aws': self.aws, 'azure': self.azure})
+
         self.root_path = os.getcwd()
+        self.store = ResultStore(os.path.join(self.root_path, 'benchmark_results'))
+        self.run_id: Optional[str] = None
+        self.manifest: Optional[RunManifest] = None
+        # Idle eviction windows learned by the idle cold start strategy, kept across runs
+        self.eviction_windows_path = os.path.join(self.root_path, 'benchmark_results', RUNS_DIR,
+                                                  'eviction_windows.json')
+        self.eviction_windows = load_eviction_windows(self.eviction_windows_path)
+        self._eviction_windows_lock = threading.Lock()
+        self.cold_stats: List[Tuple[str, str, ColdStartStats]] = []
+        # ((provider, runtime, benchmark, memory, load profile), JSONL file) of every target of the run
+        self.results_files: List[Tuple[Tuple[str, str, str, Optional[int], str], str]] = []
         self.config = load_config()
         self.deployments = load_deployments()
         self.benchmarks_info = self.__load_benchmarks_info()
-        self.http = urllib3.PoolManager(timeout=urllib3.Timeout(total=120.0))  # 2 minute timeout
+        if workers > 1:
+            self.invoker = MultiProcessInvoker(workers=workers, engine=engine, max_connections=max_connections)
+        else:
+            self.invoker = create_invoker(engine, max_connections=max_connections)
 
     def __load_benchmarks_info(self) -> Dict[str, Dict[str, Any]]:
         """Load and return benchmark data from the config file."""
@@ -72,21 +94,6 @@ class Benchmarker(LoggingBase):
 
         return benchmarks_data
 
-    def __get_provider_time_and_update_results(self, provider: str, function_name: str, start_time: int, end_time: int,
-                                               results: Dict[str, dict]):
-        """Get provider time and update the results dictionary."""
-
-        if provider == 'gcp':
-            return self.gcp.enrich_metrics(function_name=function_name, start_time=start_time, end_time=end_time,
-                                           requests=results)
-        elif provider == 'aws':
-            return self.aws.enrich_metrics(function_name, start_time, end_time, results)
-        elif provider == 'azure':
-            return self.azure.enrich_metrics(function_name, start_time, end_time, results)
-        elif provider == 'knative':
-            # TODO: Implement AWS specific provider time logic here
-            return results
-
     def __get_benchmark_data(self, providers, benchmark_names) -> Dict[str, Dict[str, Any]]:
         """
         Filter benchmark data by provider and/or benchmark name.
@@ -124,6 +131,12 @@ class Benchmarker(LoggingBase):
                         body = benchmark_info['request'].get('body')
                         benchmark_url = f"{base_url}{endpoint}"
 
+                        # Identical copies of the function, cold starts are collected from all of them in parallel
+                        replicas = [{"function_name": function_name, "benchmark_url": benchmark_url}]
+                        replicas.extend({"function_name": replica['function_name'],
+                                         "benchmark_url": f"{replica['url']}{endpoint}"}
+                                        for replica in details.get('replicas', []))
+
                         # Populate the results dictionary
                         results.setdefault(prov, {}).setdefault(runtime, {}).setdefault(bench_name, {}).update({
                             "function_name": function_name,
@@ -131,6 +144,7 @@ class Benchmarker(LoggingBase):
                             "method": http_method,
                             "body": body,
                             "memory": benchmark_info.get('memory'),
+                            "replicas": replicas,
                         })
         if not results:
             self.logging.error(
@@ -155,60 +169,8 @@ class Benchmarker(LoggingBase):
 
     def invoke_function(self, provider: str, url: str, method: str,
                         request_body: Optional[dict]) -> FunctionInvocationResult:
-        """Execute a benchmark request and measure its response time using urllib3."""
-
-        response_body = None
-        client_side_response_time = None
-        request_id = None
-        headers = {'Content-Type': 'application/json'}
-        if provider == "knative":
-            request_id = str(uuid.uuid4())
-            headers[
-                'x-client-trace-id'] = request_id  # Knative requires to set a request id manually, for the other providers the request id is extracted from the response headers
-        body_data = json.dumps(request_body) if request_body else None
-
-        try:
-            start_time = int(time.time() * 1_000_000)
-            response = self.http.request(
-                method.upper(),
-                url,
-                body=body_data,
-                headers=headers,
-            )
-            end_time = int(time.time() * 1_000_000)
-            client_side_response_time = (end_time - start_time) / 1_000_000
-            request_id = self._get_request_id(headers=response.headers, provider=provider)
-
-            response_body = response.data.decode('utf-8')
-            response_dict = json.loads(response_body) if response_body else {}
-
-        except urllib3.exceptions.HTTPError as e:
-            self.logging.error(f"HTTP error occurred for {url}: {e}")
-            exit(-1)
-        except urllib3.exceptions.RequestError as e:
-            self.logging.error(f"Request error occurred for {url}: {e}")
-            exit(-1)
-        except json.JSONDecodeError as e:
-            self.logging.error(f"Error decoding JSON response for {url}: {e}")
-            response_dict = response_body
-        except Exception as e:
-            self.logging.error(f"An unknown error occurred for {url}: {e}")
-            exit(-1)
-        return FunctionInvocationResult(request_id=request_id,
-                                        client_begin=start_time,
-                                        client_end=end_time,
-                                        client_time=client_side_response_time,
-                                        response_body=response_dict)
-
-    def _get_request_id(self, headers: Dict[str, str], provider: str) -> str:
-        if provider == 'aws':
-            return headers.get('x-amzn-RequestId')
-        elif provider == 'azure':
-            return headers.get('X-Azure-Functions-InvocationId')
-        elif provider == 'gcp':
-            return headers.get('X-Cloud-Trace-Context').split(';')[0]
-        elif provider == 'knative':
-            return headers.get('x-client-trace-id')
+        """Execute a benchmark request and measure its response time using the configured invocation engine."""
+        return self.invoker.invoke(provider=provider, url=url, method=method, request_body=request_body)
 
     def start_run(self,
                   load_profile: LoadProfile,
@@ -216,92 +178,400 @@ class Benchmarker(LoggingBase):
                   benchmark_names: Optional[List[str]] = None,
                   runtimes_to_include: Optional[List[str]] = None,
                   repetitions: int = 10,
+                  warmup: int = 0,
+                  concurrency: int = 1,
+                  duration: Optional[float] = None,
+                  arrival: ArrivalPattern = ArrivalPattern.BURST,
+                  burst_size: int = 10,
+                  burst_interval: float = 60.0,
+                  rate: float = 1.0,
+                  target_concurrency: int = 1,
+                  provider_concurrency: Optional[Dict[str, int]] = None,
+                  cold_strategy: str = 'redeploy',
+                  cold_max_attempts: int = MAX_ATTEMPTS,
+                  histogram_digits: int = 3,
+                  run_id: Optional[str] = None,
                   ):
-        """Execute benchmarks and save results."""
+        """
+        Execute benchmarks and save results.
+        Independent (provider, runtime, benchmark) targets run in parallel, at most `target_concurrency` at a time
+        per provider, unless `provider_concurrency` sets a different limit for the provider (e.g. {'aws': 4}).
+        The memory sweep of a target always runs in order.
+        Progress is recorded in the run manifest. Passing the `run_id` of an interrupted run resumes it: finalized
+        targets are skipped and cold start loops continue from their last completed repetition.
+        """
 
         # 1. Fetch benchmark urls/methods and request body
         # 2. Enforce cold start if specified
 
+        self.run_id = run_id or f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:6]}'
+        self.manifest = RunManifest(get_manifest_path(self.root_path, self.run_id))
+        if self.manifest.parameters is None:
+            self.manifest.record_run({
+                'load_profile': load_profile.value,
+                'providers': list(providers) if providers else None,
+                'benchmark_names': list(benchmark_names) if benchmark_names else None,
+                'runtimes_to_include': list(runtimes_to_include) if runtimes_to_include else None,
+                'repetitions': repetitions,
+                'warmup': warmup,
+                'concurrency': concurrency,
+                'duration': duration,
+                'arrival': arrival.value,
+                'burst_size': burst_size,
+                'burst_interval': burst_interval,
+                'rate': rate,
+                'target_concurrency': target_concurrency,
+                'provider_concurrency': provider_concurrency,
+                'cold_strategy': cold_strategy,
+                'cold_max_attempts': cold_max_attempts,
+                'histogram_digits': histogram_digits,
+            })
+        else:
+            self.logging.info(f"Resuming run {self.run_id} from its manifest.")
         self.logging.info(
-            f"Starting benchmarks. Providers: {providers}, Benchmarks: {benchmark_names}, Load Profile: {load_profile.value}, Repetitions: {repetitions}")
+            f"Starting benchmarks. Run: {self.run_id}, Providers: {providers}, Benchmarks: {benchmark_names}, Load Profile: {load_profile.value}, Repetitions: {repetitions}")
 
         benchmark_data = self.__get_benchmark_data(providers, benchmark_names)
-
+        load_options = {
+            'repetitions': repetitions,
+            'warmup': warmup,
+            'concurrency': concurrency,
+            'duration': duration,
+            'arrival': arrival,
+            'burst_size': burst_size,
+            'burst_interval': burst_interval,
+            'rate': rate,
+            'cold_strategy': cold_strategy,
+            'cold_max_attempts': cold_max_attempts,
+            'histogram_digits': histogram_digits,
+        }
+
+        targets = {}
         for prov, runtimes in benchmark_data.items():
             for runtime, benchmarks in runtimes.items():
                 if runtime not in runtimes_to_include:
                     self.logging.info(f"Skipping Benchmarks for runtime: {runtime}")
                     continue
                 for bench_name, bench_details in benchmarks.items():
+                    targets.setdefault(prov, []).append((runtime, bench_name, bench_details))
+
+        # One executor per provider, so the concurrency limit applies to each provider separately
+        provider_concurrency = provider_concurrency or {}
+        executors = {prov: ThreadPoolExecutor(max_workers=provider_concurrency.get(prov, target_concurrency),
+                                              thread_name_prefix=f'{prov}-target')
+                     for prov in targets}
+        try:
+            futures = [executors[prov].submit(self._run_target, load_profile, prov, runtime, bench_name,
+                                              bench_details, load_options)
+                       for prov, provider_targets in targets.items()
+                       for runtime, bench_name, bench_details in provider_targets]
+            for future in futures:
+                future.result()
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        self.invoker.close()
+        self.logging.info("Benchmark invocation completed. Waiting for provider times of the saved results.")
+        self.enrichment.close()
+        self.logging.info("Benchmark results enriched and saved.")
+        self.log_benchmark_results()
+        if load_profile == LoadProfile.COLD:
+            self.log_cold_stats()
+            self.log_cold_start_decomposition()
+            if cold_strategy == 'idle':
+                for prov in targets:
+                    self.logging.info(self.eviction_windows[prov].report())
+
+    def _run_target(self, load_profile: LoadProfile, prov: str, runtime: str, bench_name: str,
+                    bench_details: Dict[str, Any], load_options: Dict[str, Any]):
+        """
+        Run the memory sweep of a single (provider, runtime, benchmark) target.
+        Every invocation is appended to the JSONL results file as soon as it finished.
+        """
+        repetitions = load_options['repetitions']
+        memory_sizes = [None] if prov == 'azure' else bench_details['memory']
+        results_dir = os.path.join(self.root_path, 'benchmark_results', prov, runtime, bench_name)
+        os.makedirs(results_dir, exist_ok=True)
+
+        for memory in memory_sizes:
+            target = (prov, runtime, bench_name, memory)
+            results_file_name = f'{load_profile.name}_{repetitions}_{memory if memory else "default"}'
+            results_file = os.path.join(results_dir, f'{results_file_name}.jsonl')
+            self.results_files.append(((prov, runtime, bench_name, memory, load_profile.name), results_file))
+
+            if self.manifest.is_finalized(target):
+                self.logging.info(f"Skipping benchmark {bench_name} for {prov.upper()} provider, {runtime.upper()} "
+                                  f"runtime, Memory Size: {memory}MB. It was completed before the run was resumed.")
+                continue
+
+            window = self.manifest.invoked_window(target)
+            if window is None:
+                window = self._invoke_target(load_profile, target, bench_details, results_file, load_options)
+            else:
+                self.logging.info(f"Benchmark {bench_name} for {prov.upper()} provider, {runtime.upper()} runtime, "
+                                  f"Memory Size: {memory}MB was invoked before the run was resumed, only "
+                                  f"finalizing its results.")
+
+            # Provider times are patched into the results file later by the enrichment pipeline, the enriched file is
+            # then added to the columnar store
+            self.enrichment.submit(provider=prov, function_names=self._function_names(load_profile, bench_details),
+                                   start_time=window[0],
+                                   end_time=window[1], results_file=results_file,
+                                   on_done=partial(self._finalize_target, load_profile, target, results_file))
+
+            if load_profile == LoadProfile.BURST:
+                burst_summary = self._summarize_bursts(read_results(results_file))
+                with open(os.path.join(results_dir, f'{results_file_name}_bursts.json'), 'w') as f:
+                    json.dump(burst_summary, f, indent=4)
+
+            # Which container instances served the target, for how long and how busy they were
+            lifecycle = LifecycleTracker().add_all(read_results(results_file)).summary()
+            with open(os.path.join(results_dir, f'{results_file_name}_lifecycle.json'), 'w') as f:
+                json.dump(lifecycle, f, indent=4)
+            if lifecycle['instances']:
+                self.logging.info(
+                    f"{lifecycle['instances']} instances served {lifecycle['requests']} requests of benchmark "
+                    f"{bench_name} ({prov.upper()}, {runtime.upper()}, {memory}MB). Reuse rate "
+                    f"{lifecycle['reuse_rate']:.1%}, median lifetime {lifecycle['lifetime']['median']:.1f}s, peak "
+                    f"concurrency per instance {lifecycle['peak_concurrency_per_instance']}.")
+
+    def _invoke_target(self, load_profile: LoadProfile, target: TargetKey, bench_details: Dict[str, Any],
+                       results_file: str, load_options: Dict[str, Any]) -> Tuple[float, float]:
+        """
+        Send all invocations of one memory size of a target and return the time window they were sent in.
+        Cold start loops continue after the repetitions the manifest already recorded, other profiles start over.
+        """
+        prov, runtime, bench_name, memory = target
+        repetitions = load_options['repetitions']
+        benchmark_url = bench_details['benchmark_url']
+        http_method = bench_details['method']
+        request_body = bench_details['body']
+
+        __begin = self.manifest.started(target)
+        if __begin is None:
+            __begin = time.time()
+            self.manifest.record_started(target, __begin)
+
+        # Client-side latencies are counted as they arrive, so percentiles don't need the raw records
+        histogram = LatencyHistogram(significant_digits=load_options['histogram_digits'])
+        completed = self.manifest.completed_repetitions(target) if load_profile == LoadProfile.COLD else 0
+        if completed:
+            # Drop records the manifest doesn't know about, they are repeated below
+            truncate_results(results_file, completed)
+            for record in read_results(results_file):
+                histogram.record_seconds(record.get('client_time'))
+            self.logging.info(f"Continuing the cold starts of benchmark {bench_name} for {prov.upper()} provider, "
+                              f"{runtime.upper()} runtime after {completed} out of {repetitions} repetitions.")
+
+        self.logging.info(
+            f"Invoking benchmark {bench_name} for {prov.upper()} provider, {runtime.upper()} runtime. "
+            f"Load Profile: {load_profile.value} , Memory Size: {memory}MB")
+        # Set Memory size for the function (and all replicas the cold starts are collected from)
+        if memory:
+            for name in self._function_names(load_profile, bench_details):
+                self._set_memory_for_function(provider=prov, function_name=name, memory=memory,
+                                              native=(runtime == 'native'))
+
+        with ResultWriter(results_file, append=completed > 0) as writer:
+            if load_profile == LoadProfile.COLD:
+                stats_file = f'{os.path.splitext(results_file)[0]}_cold_stats.json'
+
+                def save_stats(recorded: int):
+                    # Enforcement efficiency is kept next to the latencies it was measured with, together with the
+                    # number of samples the results file holds, fewer than its name says if the retry budget ran out
+                    with open(stats_file, 'w') as f:
+                        json.dump(dict(stats.toDict(), repetitions=repetitions, recorded=recorded), f, indent=4)
+
+                # Enforce a cold start before every invocation, on all replicas of the function at once
+                def record(repetition: int, result: FunctionInvocationResult, attempts: int):
+                    histogram.record_seconds(result.client_time)  # Only cold samples, not the warm misses
+                    writer.write(dict(result.toDict(), cold_attempts=attempts))
+                    writer.checkpoint()  # Every cold sample is expensive, don't risk losing it
+                    self.manifest.record_repetition(target, repetition)
+                    save_stats(repetition)  # Saved with every sample, so a resumed run continues the counts
+
+                stats = ColdStartStats()
+                if completed and os.path.exists(stats_file):
+                    with open(stats_file, 'r') as f:
+                        stats = ColdStartStats.fromDict(json.load(f))
+                    # A sample the manifest recorded after the stats were last saved took at least one attempt
+                    missing = max(0, completed - stats.samples)
+                    stats.attempts += missing
+                    stats.samples = completed
+                if load_options['cold_strategy'] == 'idle':
+                    strategy = IdleTimeoutStrategy(self.eviction_windows[prov])
+                else:
+                    strategy = RedeployStrategy(
+                        lambda name: self.enforce_cold_start(provider=prov, function_name=name,
+                                                             native=(runtime == 'native')),
+                        stats=stats)
+                pipeline = ColdStartPipeline(
+                    replicas=bench_details['replicas'],
+                    strategy=strategy,
+                    invoke=lambda url: self.invoke_function(provider=prov, url=url, method=http_method,
+                                                            request_body=request_body),
+                    max_attempts=load_options['cold_max_attempts'],
+                    stats=stats)
+                recorded = pipeline.run(repetitions=repetitions, on_sample=record, completed=completed)
+                self.cold_stats.append((prov, runtime, stats))
+                save_stats(recorded)
+                if load_options['cold_strategy'] == 'idle':
+                    with self._eviction_windows_lock:
+                        save_eviction_windows(self.eviction_windows_path, self.eviction_windows)
+
+            if load_profile == LoadProfile.WARM:
+                # Keep `concurrency` callers busy after discarding the warm-up invocations
+                self._run_warm(provider=prov, url=benchmark_url, method=http_method,
+                               request_body=request_body, repetitions=repetitions,
+                               warmup=load_options['warmup'],
+                               concurrency=load_options['concurrency'],
+                               duration=load_options['duration'], writer=writer, histogram=histogram)
+
+            if load_profile == LoadProfile.BURST:
+                # Open-loop: requests leave on schedule whether or not earlier ones have returned
+                schedule = self._build_arrival_schedule(arrival=load_options['arrival'], repetitions=repetitions,
+                                                        burst_size=load_options['burst_size'],
+                                                        burst_interval=load_options['burst_interval'],
+                                                        rate=load_options['rate'])
+                self._run_burst(provider=prov, url=benchmark_url, method=http_method,
+                                request_body=request_body, schedule=schedule, writer=writer,
+                                histogram=histogram)
+
+        save_histogram(f'{os.path.splitext(results_file)[0]}_histogram.json', histogram)
+        summary = histogram.summary()
+        if summary['count']:
+            self.logging.info(
+                f"Client-side latency of benchmark {bench_name} ({prov.upper()}, {runtime.upper()}, {memory}MB): "
+                f"p50 {summary['p50'] / 1000:.1f}ms, p90 {summary['p90'] / 1000:.1f}ms, "
+                f"p99 {summary['p99'] / 1000:.1f}ms, p99.9 {summary['p99.9'] / 1000:.1f}ms over "
+                f"{summary['count']} invocations.")
+
+        end_time = time.time() + 1
+        self.manifest.record_invoked(target, __begin - 1, end_time)
+        return __begin - 1, end_time
+
+    @staticmethod
+    def _function_names(load_profile: LoadProfile, bench_details: Dict[str, Any]) -> List[str]:
+        """Functions invoked for a target, the replicas are only used by the cold start profile."""
+        if load_profile == LoadProfile.COLD:
+            return [replica['function_name'] for replica in bench_details['replicas']]
+        return [bench_details['function_name']]
+
+    def _finalize_target(self, load_profile: LoadProfile, target: TargetKey, results_file: str):
+        """Add the enriched results of a target to the columnar store and mark it as done in the run manifest."""
+        prov, runtime, bench_name, memory = target
+        self.store.add(results_file=results_file, run_id=self.run_id, provider=prov, runtime=runtime,
+                       benchmark=bench_name, load_profile=load_profile.name, memory=memory)
+        self.manifest.record_finalized(target)
+
+    def _run_warm(self, provider: str, url: str, method: str, request_body: Optional[dict], repetitions: int,
+                  warmup: int, concurrency: int, duration: Optional[float], writer: ResultWriter,
+                  histogram: Optional[LatencyHistogram] = None):
+        """
+        Closed-loop load generator for the WARM profile.
+        `warmup` invocations are sent first and thrown away, then `concurrency` workers each send their next request
+        as soon as the previous one returned, until `repetitions` requests were sent or `duration` seconds elapsed.
+        """
+        if warmup:
+            self.logging.info(f"Sending {warmup} warm-up invocations to {url}. Their results are discarded.")
+        self.logging.info(
+            f"Running {concurrency} concurrent workers against {url} "
+            f"{f'for {duration}s' if duration else f'for {repetitions} requests'}.")
 
-                    memory_sizes = [None] if prov == 'azure' else bench_details['memory']
-
-                    for memory in memory_sizes:
-                        __begin = time.time()
-                        function_name = bench_details['function_name']
-                        benchmark_url = bench_details['benchmark_url']
-                        http_method = bench_details['method']
-                        request_body = bench_details['body']
-
-                        benchmark_results = {}
-
-                        self.logging.info(
-                            f"Invoking benchmark {bench_name} for {prov.upper()} provider, {runtime.upper()} runtime. "
-                            f"Load Profile: {load_profile.value} , Memory Size: {memory}MB")
-                        # Set Memory size for the function
-                        if memory:
-                            self._set_memory_for_function(provider=prov, function_name=function_name, memory=memory,
-                                                          native=(runtime == 'native'))
-
-                        if load_profile == LoadProfile.COLD:
-                            # Call a Benchmark x amount of times while enforcing a cold start after each request
-                            cold_start_counter = 0
-                            while cold_start_counter < repetitions:
-
-                                self.enforce_cold_start(provider=prov, function_name=function_name,
-                                                        native=(runtime == 'native'))
-                                result = self.invoke_function(provider=prov, url=benchmark_url, method=http_method,
-                                                              request_body=request_body)
-                                if not result.response_body.get('is_cold'):
-                                    self.logging.error(
-                                        f"Expected a cold start, but it was not detected. Benchmark: {bench_name}, "
-                                        f"Provider: {prov}, Runtime: {runtime}")
-                                    time.sleep(5)
-                                    continue
-
-                                cold_start_counter += 1
-                                benchmark_results.setdefault(result.request_id,
-                                                             json.loads(
-                                                                 FunctionInvocationResult(request_id=result.request_id,
-                                                                                          client_begin=result.client_begin,
-                                                                                          client_end=result.client_end,
-                                                                                          client_time=result.client_time,
-                                                                                          response_body=result.response_body).toJSON()))
-                        if load_profile == LoadProfile.WARM:
-                            # TODO: Implement logic for warm start here
-
-                            pass
-
-                        if load_profile == LoadProfile.BURST:
-                            # TODO: Implement logic for burst start here
-                            pass
-
-                        # Save benchmark results to a file
-                        results_dir = os.path.join(self.root_path, 'benchmark_results', prov, runtime, bench_name)
-                        os.makedirs(results_dir, exist_ok=True)
-
-                        benchmark_results = self.__get_provider_time_and_update_results(prov,
-                                                                                        function_name,
-                                                                                        __begin - 1,
-                                                                                        time.time() + 1,
-                                                                                        benchmark_results)
-
-                        with open(os.path.join(results_dir,
-                                               f'{load_profile.name}_{repetitions}_{memory if memory else "default"}.json'),
-                                  'w') as f:
-                            json.dump(benchmark_results, f, indent=4)
-
-        self.logging.info("Benchmark invocation completed and results saved.")
+        recorded = 0
+        failed = 0
+
+        def record(result: FunctionInvocationResult):
+            nonlocal recorded, failed
+            recorded += 1
+            if result.error is not None:
+                failed += 1
+            writer.write(result.toDict())
+
+        self.invoker.run_closed_loop(provider=provider, url=url, method=method, request_body=request_body,
+                                     repetitions=repetitions, warmup=warmup, concurrency=concurrency,
+                                     duration=duration, on_result=record, histogram=histogram)
+
+        self.logging.info(f"Warm run completed with {recorded} recorded invocations, {failed} of them failed.")
+
+    def _build_arrival_schedule(self, arrival: ArrivalPattern, repetitions: int, burst_size: int,
+                                burst_interval: float, rate: float) -> List[Tuple[float, int, int]]:
+        """
+        Build an open-loop schedule of (offset in seconds, burst index, simultaneous requests) tuples.
+        BURST sends `repetitions` bursts of `burst_size` requests, `burst_interval` seconds apart.
+        POISSON sends `repetitions` requests at a mean `rate` per second, grouped into windows of `burst_interval`.
+        STEP runs `repetitions` steps of `burst_interval` seconds, step i sends `rate * (i + 1)` requests per second.
+        """
+        if burst_interval <= 0:
+            raise ValueError('burst_interval must be positive.')
+        schedule = []
+        if arrival == ArrivalPattern.BURST:
+            for burst in range(repetitions):
+                schedule.append((burst * burst_interval, burst, burst_size))
+        elif arrival == ArrivalPattern.POISSON:
+            offset = 0.0
+            for _ in range(repetitions):
+                schedule.append((offset, int(offset // burst_interval), 1))
+                offset += random.expovariate(rate)
+        elif arrival == ArrivalPattern.STEP:
+            for step in range(repetitions):
+                step_rate = rate * (step + 1)
+                for i in range(math.ceil(step_rate * burst_interval)):
+                    schedule.append((step * burst_interval + i / step_rate, step, 1))
+        return schedule
+
+    def _run_burst(self, provider: str, url: str, method: str, request_body: Optional[dict],
+                   schedule: List[Tuple[float, int, int]], writer: ResultWriter,
+                   histogram: Optional[LatencyHistogram] = None):
+        """
+        Open-loop load generator for the BURST profile.
+        Every schedule entry is dispatched at its offset, regardless of requests still in flight.
+        Requests belonging to the same entry leave at the same instant.
+        """
+        self.logging.info(f"Dispatching {sum(size for _, _, size in schedule)} requests in "
+                          f"{len(set(burst for _, burst, _ in schedule))} bursts to {url}.")
+
+        recorded = 0
+        failed = 0
+
+        def record(burst: int, result: FunctionInvocationResult):
+            nonlocal recorded, failed
+            recorded += 1
+            if result.error is not None:
+                failed += 1
+            writer.write(dict(result.toDict(), burst=burst))
+
+        self.invoker.run_schedule(provider=provider, url=url, method=method, request_body=request_body,
+                                  schedule=schedule, on_result=record, histogram=histogram)
+
+        self.logging.info(f"Burst run completed with {recorded} recorded invocations, {failed} of them failed.")
+
+    def _summarize_bursts(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Count the distinct containers and cold starts that served every burst."""
+        bursts = {}
+        for record in records:
+            response_body = record.get('response_body')
+            if not isinstance(response_body, dict):
+                response_body = {}
+            burst = bursts.setdefault(record.get('burst'), {'requests': 0, 'containers': set(), 'cold_starts': 0})
+            burst['requests'] += 1
+            if response_body.get('container_id') is not None:
+                burst['containers'].add(response_body['container_id'])
+            if response_body.get('is_cold'):
+                burst['cold_starts'] += 1
+
+        summary = [{
+            'burst': burst,
+            'requests': details['requests'],
+            'distinct_containers': len(details['containers']),
+            'cold_starts': details['cold_starts'],
+        } for burst, details in sorted(bursts.items(), key=lambda item: item[0])]
+
+        self.logging.info("Burst scale-out:\n" + tabulate(
+            [[b['burst'], b['requests'], b['distinct_containers'], b['cold_starts']] for b in summary],
+            headers=["Burst", "Requests", "Distinct Containers", "Cold Starts"], tablefmt="pretty"))
+        return summary
 
     def _set_memory_for_function(self, provider: str, function_name: str, memory: int, native: bool):
         if provider == 'gcp':
@@ -312,27 +582,89 @@ class Benchmarker(LoggingBase):
             # TODO: Implement AWS specific memory setting logic here
             pass
 
-    def log_benchmark_results(self, results, intended_cold_start: bool):
-        results_table_data = []
-        headers = ["Provider", "Benchmark Name", "Client-SideResponse Time (s)", "Provider Start", "Provider End",
-                   "Was it a Cold Start?", "Intended Cold Start?"]
-        for prov, runtimes in results.items():
-            for runtime, benchmarks in runtimes.items():
-                for bench_name, details in benchmarks.items():
-                    results_table_data.append([
-                        prov, bench_name, details['client_side_response_time'], details['response_data']['begin'],
-                        details['response_data']['end'], details['response_data'].get('is_cold', 'N/A'),
-                        intended_cold_start])
+    def log_cold_stats(self):
+        """Log how many invocations the cold start strategy needed per cold sample, per provider and runtime."""
+        totals = {}
+        for prov, runtime, stats in self.cold_stats:
+            total = totals.setdefault((prov, runtime), {'attempts': 0, 'samples': 0, 'abandoned': 0})
+            for key in total:
+                total[key] += getattr(stats, key)
+
+        table = [[prov.upper(), runtime, total['attempts'], total['samples'],
+                  f"{(total['attempts'] - total['samples']) / total['attempts']:.1%}" if total['attempts'] else '-',
+                  total['abandoned']]
+                 for (prov, runtime), total in sorted(totals.items())]
+        if table:
+            self.logging.info("Cold start enforcement:\n" + tabulate(
+                table, headers=['Provider', 'Runtime', 'Attempts', 'Cold Samples', 'Cold Miss Rate', 'Dropped Samples']))
+
+    def log_benchmark_results(self):
+        """
+        Log the response time statistics of every target of the run, split into cold and warm invocations, and save
+        them next to the run manifest.
+        """
+        try:
+            rows = summarize(samples_from_files(self.results_files), metrics=('client_time', 'provider_time'))
+        except ImportError as e:
+            self.logging.warning(f"{e} Skipping the results summary.")
+            return
+        except Exception as e:
+            # The measurements are already saved, a failing report must not fail the run
+            self.logging.error(f"Failed to summarize the benchmark results: {e}")
+            return
 
-        self.logging.info("Benchmark results:")
-        self.logging.info("\n" + tabulate(results_table_data, headers=headers, tablefmt="pretty"))
+        summary_path = os.path.join(self.root_path, 'benchmark_results', RUNS_DIR, f'{self.run_id}_summary.json')
+        with open(summary_path, 'w') as f:
+            json.dump(rows, f, indent=4)
+        self.logging.info("Benchmark results (client-side response time):")
+        self.logging.info("\n" + format_summary(rows))
+
+    def log_cold_start_decomposition(self):
+        """
+        Log where the time of the cold starts of the run went (network and platform, runtime initialization and
+        handler), JVM and native side by side, and save it next to the run manifest.
+        """
+        try:
+            rows = decompose_cold_starts(samples_from_files(self.results_files))
+        except ImportError as e:
+            self.logging.warning(f"{e} Skipping the cold start decomposition.")
+            return
+        except Exception as e:
+            self.logging.error(f"Failed to decompose the cold starts: {e}")
+            return
+        if not rows:
+            self.logging.warning("No enriched cold invocations, skipping the cold start decomposition.")
+            return
+
+        decomposition_path = os.path.join(self.root_path, 'benchmark_results', RUNS_DIR,
+                                          f'{self.run_id}_cold_starts.json')
+        with open(decomposition_path, 'w') as f:
+            json.dump(rows, f, indent=4)
+        self.logging.info("Cold start decomposition (median, share of the mean client time):")
+        self.logging.info("\n" + format_cold_start_decomposition(rows))
+
+
+def parse_provider_concurrency(values: Iterable[str]) -> Dict[str, int]:
+    """Parse the PROVIDER=N values of --provider-concurrency into a {provider: limit} mapping."""
+    limits = {}
+    for value in values:
+        provider, _, limit = value.partition('=')
+        provider = provider.strip()
+        if provider not in PROVIDERS:
+            raise click.BadParameter(f'Unknown provider in {value!r}, expected one of {", ".join(PROVIDERS)}.',
+                                     param_hint='--provider-concurrency')
+        if not limit.strip().isdigit() or int(limit) < 1:
+            raise click.BadParameter(f'Expected PROVIDER=N with N >= 1, got {value!r}.',
+                                     param_hint='--provider-concurrency')
+        limits[provider] = int(limit)
+    return limits
 
 
 @click.command()
 @click.option('-p', '--providers',
               help='Specify the provider to run benchmarks for. If not specified, all providers will be benchmarked.',
               default=['gcp', 'aws', 'azure', 'knative'],
-              multiple=True, type=click.Choice(['aws', 'azure', 'gcp', 'knative']))
+              multiple=True, type=click.Choice(PROVIDERS))
 @click.option('-b', '--benchmarks', multiple=True,
               default=get_benchmark_names(),
               help='Specify which benchmarks to run.', type=click.Choice(get_benchmark_names()))
@@ -340,26 +672,132 @@ class Benchmarker(LoggingBase):
               default=get_runtime_names(),
               help='Specify which runtimes should be ran', type=click.Choice(get_runtime_names()))
 @click.option('-l', '--load-profile',
-              required=True,
-              help='Specify a Load Profile for the Benchmark',
+              help='Specify a Load Profile for the Benchmark. Required unless a run is resumed.',
               type=click.Choice([profile.value for profile in LoadProfile])
               )
 @click.option('-r', '--repetitions',
-              required=True,
-              help='Specify how often to invoke the benchmark.',
+              help='Specify how often to invoke the benchmark. Required unless a run is resumed.',
               type=click.INT
               )
+@click.option('-w', '--warmup',
+              default=0, show_default=True,
+              help='Number of warm-up invocations whose results are discarded (warm profile).',
+              type=click.IntRange(min=0)
+              )
+@click.option('-c', '--concurrency',
+              default=1, show_default=True,
+              help='Number of concurrent workers sending requests (warm profile).',
+              type=click.IntRange(min=1)
+              )
+@click.option('-d', '--duration',
+              default=None,
+              help='Run the warm profile for this many seconds instead of a fixed number of repetitions.',
+              type=click.FloatRange(min=0, min_open=True)
+              )
+@click.option('-a', '--arrival',
+              default=ArrivalPattern.BURST.value, show_default=True,
+              help='Arrival pattern of the burst profile. With burst, --repetitions is the number of bursts, with '
+                   'poisson the number of requests and with step the number of rate steps.',
+              type=click.Choice([pattern.value for pattern in ArrivalPattern])
+              )
+@click.option('-k', '--burst-size',
+              default=10, show_default=True,
+              help='Number of simultaneous requests per burst (burst arrival).',
+              type=click.IntRange(min=1)
+              )
+@click.option('-i', '--burst-interval',
+              default=60.0, show_default=True,
+              help='Seconds between bursts, length of a rate step and of the windows poisson arrivals are grouped by.',
+              type=click.FloatRange(min=0, min_open=True)
+              )
+@click.option('--rate',
+              default=1.0, show_default=True,
+              help='Mean requests per second (poisson arrival) or rate increase per step (step arrival).',
+              type=click.FloatRange(min=0, min_open=True)
+              )
+@click.option('-e', '--engine',
+              default='sync', show_default=True,
+              help='Invocation engine. sync uses blocking urllib3 calls on threads, async keeps all requests on one '
+                   'asyncio event loop and scales to thousands of requests in flight.',
+              type=click.Choice(['sync', 'async'])
+              )
+@click.option('--workers',
+              default=1, show_default=True,
+              help='Number of load generating processes the warm and burst profiles are split across. '
+                   'Every process is pinned to its own CPU.',
+              type=click.IntRange(min=1)
+              )
+@click.option('-t', '--target-concurrency',
+              default=1, show_default=True,
+              help='Number of (runtime, benchmark) targets benchmarked at the same time per provider. '
+                   'The memory sizes of a target are always benchmarked one after another.',
+              type=click.IntRange(min=1)
+              )
+@click.option('--provider-concurrency', 'provider_concurrency',
+              multiple=True, metavar='PROVIDER=N',
+              help='Target concurrency of one provider, overrides --target-concurrency for it. '
+                   'Can be repeated, e.g. --provider-concurrency aws=4 --provider-concurrency gcp=2.',
+              type=click.STRING
+              )
+@click.option('--cold-strategy',
+              default='redeploy', show_default=True,
+              help='How the cold profile gets rid of warm instances. redeploy changes an environment variable before '
+                   'every invocation, idle waits until the provider evicted the idle instances (a real scale from '
+                   'zero) and learns the eviction window on the way.',
+              type=click.Choice(['redeploy', 'idle'])
+              )
+@click.option('--cold-max-attempts',
+              default=MAX_ATTEMPTS, show_default=True,
+              help='Invocations one cold sample may take before it is dropped and collected again, the target may '
+                   'spend this many invocations per sample (cold profile).',
+              type=click.IntRange(min=1)
+              )
+@click.option('--histogram-digits',
+              default=3, show_default=True,
+              help='Significant digits of the latency histogram kept per target, higher is more precise and uses '
+                   'more memory.',
+              type=click.IntRange(min=1, max=5)
+              )
+@click.option('--resume', 'resume',
+              default=None, metavar='RUN_ID',
+              help='Resume an interrupted run. Completed targets are skipped and cold start loops continue from '
+                   'their last completed repetition. The other benchmark options are taken from the run manifest.',
+              type=click.STRING
+              )
 def main(providers: Optional[List[str] | Tuple[str]], benchmarks: Optional[List[str] | Tuple[str]],
          runtimes: Optional[List[str] | Tuple[str]],
-         load_profile: LoadProfile, repetitions: int):
+         load_profile: Optional[str], repetitions: Optional[int], warmup: int, concurrency: int,
+         duration: Optional[float], arrival: str, burst_size: int, burst_interval: float, rate: float, engine: str,
+         workers: int, target_concurrency: int, provider_concurrency: Tuple[str], cold_strategy: str, cold_max_attempts: int,
+         histogram_digits: int, resume: Optional[str]):
     """CLI entry point for running benchmarks."""
-    benchmark_manager = Benchmarker()
-
-    load_profile = LoadProfile(load_profile)
-    benchmark_manager.start_run(providers=providers, benchmark_names=benchmarks, load_profile=load_profile,
-                                runtimes_to_include=runtimes, repetitions=repetitions)
+    if resume:
+        # The benchmark parameters of a resumed run come from its manifest, only the engine settings can change
+        parameters = RunManifest(get_manifest_path(os.getcwd(), resume)).parameters
+        if parameters is None:
+            raise click.BadParameter(f'No manifest found for run {resume}.', param_hint='--resume')
+        parameters['load_profile'] = LoadProfile(parameters['load_profile'])
+        parameters['arrival'] = ArrivalPattern(parameters['arrival'])
+    else:
+        if load_profile is None or repetitions is None:
+            raise click.UsageError('--load-profile and --repetitions are required unless --resume is given.')
+        parameters = {'providers': providers, 'benchmark_names': benchmarks, 'load_profile': LoadProfile(load_profile),
+                      'runtimes_to_include': runtimes, 'repetitions': repetitions, 'warmup': warmup,
+                      'concurrency': concurrency, 'duration': duration, 'arrival': ArrivalPattern(arrival),
+                      'burst_size': burst_size, 'burst_interval': burst_interval, 'rate': rate,
+                      'target_concurrency': target_concurrency,
+                      'provider_concurrency': parse_provider_concurrency(provider_concurrency),
+                      'cold_strategy': cold_strategy,
+                      'cold_max_attempts': cold_max_attempts, 'histogram_digits': histogram_digits}
+
+    benchmark_manager = Benchmarker(max_connections=max(parameters['concurrency'], parameters['burst_size']),
+                                    engine=engine, workers=workers)
+    benchmark_manager.start_run(run_id=resume, **parameters)
 
 
 # python benchmarker -p gcp -b echo/... --load-profile cold/warm/burst --repetitions 50
+# python benchmarker -p aws -b echo --load-profile warm --repetitions 1000 --warmup 20 --concurrency 16
+# python benchmarker -p gcp -b echo --load-profile burst --repetitions 5 --burst-size 50 --burst-interval 120
+# python benchmarker --resume 20240101-120000-a1b2c3
 if __name__ == "__main__":
     main()
@@ -2,19 +2,29 @@
 from builtins import list
 
 import click
+import copy
 import os
 import sys
 import uuid
 import platform
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
 from tabulate import tabulate
 
+from serverlessbench.artifacts import needs_build, record_build
 from serverlessbench.aws import AWS
 from serverlessbench.azure import Azure
 from serverlessbench.gcp import GCP
 from serverlessbench.knative import Knative
 from serverlessbench.logger import LoggingBase
 from serverlessbench.utils import execute, load_config, load_deployments, save_config, save_deployments, find_deployment, \
-    get_benchmark_names
+    get_benchmark_names, deployments_lock
+
+# Memory a single Maven build needs, native image builds are by far the most demanding
+BUILD_MEMORY = {'jvm': 2 * 1024 ** 3, 'native': 8 * 1024 ** 3}
+# Deploys running concurrently against one provider, bounded by the control plane rate limits
+DEPLOY_CONCURRENCY = {'aws': 8, 'gcp': 4, 'azure': 2, 'knative': 4}
 
 
 class Deployer(LoggingBase):
@@ -39,53 +49,247 @@ class Deployer(LoggingBase):
                     f"Benchmark {benchmark_name} not found in {provider}{' as native.' if native else '.'}")
                 return
 
-            if provider == 'gcp':
-                self.gcp.delete(deployment['function_name'], deployment.get('bucket'), self.config['providers']['gcp'].get('region'),self.config['providers']['gcp'].get('project'), native)
-            elif provider == 'aws':
-                self.aws.delete(deployment['function_name'], deployment.get('bucket'), self.config['providers']['aws'].get('region'))
-            elif provider == 'azure':
-                self.azure.delete(deployment['function_name'], deployment['account_name'])
-            elif provider == 'knative':
-                self.knative.delete(self.config, os.path.join(self.root_path, "benchmarks", benchmark_name), deployment.get('bucket'))
-            else:
-                self.logging.error("Unsupported provider. Please use 'aws', 'azure', 'gcp' or 'knative'.")
-                sys.exit(1)
+            for replica in deployment.get('replicas', []):
+                self._delete_function(provider, benchmark_name, replica, native)
+            self._delete_function(provider, benchmark_name, deployment, native)
 
             deployments = load_deployments()
             del deployments[provider]["native" if native else "jvm"][benchmark_name]
             save_deployments(deployments)
 
-    def create(self, provider: str, benchmarks: list, native: bool):
+    def _delete_function(self, provider: str, benchmark_name: str, deployment: dict, native: bool):
+        if provider == 'gcp':
+            self.gcp.delete(deployment['function_name'], deployment.get('bucket'), self.config['providers']['gcp'].get('region'),self.config['providers']['gcp'].get('project'), native)
+        elif provider == 'aws':
+            self.aws.delete(deployment['function_name'], deployment.get('bucket'), self.config['providers']['aws'].get('region'))
+        elif provider == 'azure':
+            self.azure.delete(deployment['function_name'], deployment['account_name'])
+        elif provider == 'knative':
+            self.knative.delete(self.config, os.path.join(self.root_path, "benchmarks", benchmark_name), deployment.get('bucket'))
+        else:
+            self.logging.error("Unsupported provider. Please use 'aws', 'azure', 'gcp' or 'knative'.")
+            sys.exit(1)
+
+    def create(self, provider: str, benchmarks: list, native: bool, replicas: Optional[int] = None,
+               parallel: bool = False):
         self.logging.info(f"Deploying benchmarks {benchmarks} to {provider}{' as native.' if native else '.'}")
 
         benchmark_map = {benchmark['name']: benchmark for benchmark in self.config['benchmarks']}
+        benchmarks = [benchmark_name for benchmark_name in benchmarks if benchmark_name in benchmark_map]
+        self._reactor_build(provider, benchmarks, native)
 
-        for benchmark_name in benchmarks:
-            benchmark = benchmark_map.get(benchmark_name)
-            if benchmark:
-                function_name = f'quarkus{"-native" if native else ""}-{benchmark_name}-{str(uuid.uuid4())[0:8]}'
-
-                deployment = find_deployment(benchmark_name, provider, native)
-                update = False
-                if deployment is not None:
-                    function_name = deployment['function_name']
-                    self.logging.warning(f"Function {function_name} already exists. Updating it.")
-                    update = True
-
-                deployments = load_deployments()
-                if provider == 'gcp':
-                    deployments, self.config = self.gcp.deploy(self.root_path, self.config, deployments, benchmark_name, benchmark, function_name, native, update)
-                elif provider == 'aws':
-                    deployments, self.config = self.aws.deploy(self.root_path, self.config, deployments, benchmark_name, benchmark, function_name, native, update)
-                elif provider == 'azure':
-                    deployments, self.config = self.azure.deploy(self.root_path, self.config, deployments, benchmark_name, benchmark, function_name, native, update)
-                elif provider == 'knative':
-                    deployments, self.config = self.knative.deploy(self.root_path, self.config, deployments, benchmark_name, benchmark, function_name, native, update)
+        if not parallel:
+            for benchmark_name in benchmarks:
+                self._create_benchmark(provider, benchmark_name, benchmark_map[benchmark_name], native, replicas)
+            return
+
+        # Function names are needed before building (Azure bakes them into the package)
+        function_names = {benchmark_name: self._function_name(provider, benchmark_name, native)
+                          for benchmark_name in benchmarks}
+        build_workers = self._build_workers(native)
+        deploy_workers = DEPLOY_CONCURRENCY.get(provider, 1)
+        self.logging.info(f"Building {len(benchmarks)} benchmarks with {build_workers} parallel builds, deploying "
+                          f"{deploy_workers} at a time.")
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=build_workers, thread_name_prefix='build') as builds, \
+                ThreadPoolExecutor(max_workers=deploy_workers, thread_name_prefix='deploy') as deploys:
+            build_futures = {builds.submit(self._build, provider, benchmark_name, function_names[benchmark_name],
+                                           native): benchmark_name for benchmark_name in benchmarks}
+            deploy_futures = {}
+            # Every benchmark is deployed as soon as its own build is done
+            for future in as_completed(build_futures):
+                benchmark_name = build_futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logging.error(f"Building benchmark {benchmark_name} failed: {e}")
+                    failed.append(benchmark_name)
+                    continue
+                deploy_futures[deploys.submit(self._create_benchmark, provider, benchmark_name,
+                                              benchmark_map[benchmark_name], native, replicas,
+                                              function_names[benchmark_name])] = benchmark_name
+
+            for future in as_completed(deploy_futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logging.error(f"Deploying benchmark {deploy_futures[future]} failed: {e}")
+                    failed.append(deploy_futures[future])
+
+        if failed:
+            self.logging.error(f"Failed to deploy benchmarks {sorted(failed)} to {provider}.")
+            sys.exit(1)
+
+    def _create_benchmark(self, provider: str, benchmark_name: str, benchmark: dict, native: bool,
+                          replicas: Optional[int], function_name: Optional[str] = None):
+        runtime = "native" if native else "jvm"
+        deployment = find_deployment(benchmark_name, provider, native)
+        if function_name is None:
+            function_name = self._function_name(provider, benchmark_name, native)
+        update = False
+        if deployment is not None:
+            self.logging.warning(f"Function {function_name} already exists. Updating it.")
+            update = True
+
+        # Deployed into a scratch copy and merged afterwards, so concurrent deploys don't overwrite each other
+        scratch, config = self._deploy(provider, {provider: {runtime: {}}}, benchmark_name, benchmark, function_name,
+                                       native, update)
+        entry = scratch[provider][runtime].get(benchmark_name, deployment)
+        if deployment is not None and deployment.get('replicas'):
+            # Providers rewrite the deployment entry, the replica group must survive updates
+            entry['replicas'] = deployment['replicas']
+        with deployments_lock:
+            deployments = load_deployments()
+            deployments.setdefault(provider, {}).setdefault(runtime, {})[benchmark_name] = entry
+            save_deployments(deployments)
+            self._merge_config(provider, config)
+
+        if replicas is not None:
+            self._deploy_replicas(provider, benchmark_name, benchmark, native, replicas)
+        elif deployment is not None and deployment.get('replicas'):
+            # Keep existing replicas in sync with the primary function
+            self._deploy_replicas(provider, benchmark_name, benchmark, native, len(deployment['replicas']) + 1)
+
+    def _deploy_replicas(self, provider: str, benchmark_name: str, benchmark: dict, native: bool, replicas: int):
+        """
+        Grow or shrink the replica group of a benchmark to `replicas` identical functions (including the primary one).
+        Replicas are recorded in deployments.json under the 'replicas' key of the benchmark. The benchmarker collects
+        cold starts from all of them in parallel, so one replica is invoked while the others are being redeployed.
+        """
+        runtime = "native" if native else "jvm"
+        if provider == 'knative' and replicas > 1:
+            self.logging.warning("Knative cold starts are not enforced by redeploying, replicas are not supported.")
+            return
+
+        group = load_deployments()[provider][runtime][benchmark_name].get('replicas', [])
+        self.logging.info(f"Deploying {replicas - 1} replicas of benchmark {benchmark_name} to {provider}.")
+
+        for index in range(replicas - 1):
+            update = index < len(group)
+            function_name = group[index]['function_name'] if update else self._new_function_name(benchmark_name,
+                                                                                                  native)
+            # Providers record their deployment under the benchmark name, which is taken by the primary function
+            replica_deployments = {provider: {runtime: {}}}
+            replica_deployments, config = self._deploy(provider, replica_deployments, benchmark_name, benchmark,
+                                                       function_name, native, update)
+            replica = replica_deployments[provider][runtime].get(benchmark_name)
+            if replica is not None:
+                if update:
+                    group[index] = replica
                 else:
-                    self.logging.error("Unsupported provider. Please use 'aws', 'azure', 'gcp' or 'knative'.")
-                    sys.exit(1)
-                save_deployments(deployments)
-                save_config(self.config)
+                    group.append(replica)
+            self._save_replicas(provider, runtime, benchmark_name, group)
+            with deployments_lock:
+                self._merge_config(provider, config)
+
+        for replica in group[max(replicas - 1, 0):]:
+            self.logging.info(f"Deleting surplus replica {replica['function_name']}.")
+            self._delete_function(provider, benchmark_name, replica, native)
+        del group[max(replicas - 1, 0):]
+        self._save_replicas(provider, runtime, benchmark_name, group)
+
+    @staticmethod
+    def _save_replicas(provider: str, runtime: str, benchmark_name: str, group: list):
+        with deployments_lock:
+            deployments = load_deployments()
+            if group:
+                deployments[provider][runtime][benchmark_name]['replicas'] = group
+            else:
+                deployments[provider][runtime][benchmark_name].pop('replicas', None)
+            save_deployments(deployments)
+
+    def _reactor_build(self, provider: str, benchmarks: list, native: bool):
+        """
+        Build every benchmark whose build is out of date in one Maven reactor build over the root pom.xml, so Maven
+        starts and resolves dependencies once and builds independent modules in parallel. The providers then find
+        the builds in the cache. Azure packages embed the function app name, they are still built one by one.
+        """
+        if provider == 'azure':
+            return
+        stale = [benchmark_name for benchmark_name in benchmarks
+                 if needs_build(provider, benchmark_name, native, self._submodule_path(benchmark_name), self.logging)]
+        if not stale:
+            return
+
+        profile = f'{provider}-native' if native else provider
+        threads = self._build_workers(native)
+        self.logging.info(f'Building benchmarks {stale} with profile "{profile}" in one reactor build, '
+                          f'{threads} modules at a time.')
+        for benchmark_name in stale:
+            # Only the rebuilt modules start from scratch, the modules they depend on are built incrementally
+            shutil.rmtree(os.path.join(self._submodule_path(benchmark_name), 'target'), ignore_errors=True)
+        execute([self.mvnw_path, 'package', '-P', profile, '-T', str(threads), '--also-make',
+                 '--projects', ','.join(f'benchmarks/{benchmark_name}' for benchmark_name in stale)],
+                "Error while building benchmarks.", self.logging, cwd=self.root_path)
+
+        for benchmark_name in stale:
+            record_build(provider, benchmark_name, native, self._submodule_path(benchmark_name))
+
+    def _submodule_path(self, benchmark_name: str) -> str:
+        return os.path.join(self.root_path, "benchmarks", benchmark_name)
+
+    def _config_copy(self) -> dict:
+        """Private copy of the config for one build or deploy, providers change it while they work."""
+        with deployments_lock:
+            return copy.deepcopy(self.config)
+
+    def _merge_config(self, provider: str, config: dict):
+        """Take over the provider settings a deploy added to its copy of the config and save them."""
+        with deployments_lock:
+            self.config['providers'][provider].update(config['providers'][provider])
+            save_config(self.config)
+
+    def _build(self, provider: str, benchmark_name: str, function_name: str, native: bool):
+        config = self._config_copy()
+        if provider == 'gcp':
+            self.gcp.build_if_changed(self.root_path, config, benchmark_name, function_name, native)
+        elif provider == 'aws':
+            self.aws.build_if_changed(self.root_path, config, benchmark_name, function_name, native)
+        elif provider == 'azure':
+            self.azure.build_if_changed(self.root_path, config, benchmark_name, function_name, native)
+        elif provider == 'knative':
+            self.knative.build_if_changed(self.root_path, config, benchmark_name, function_name, native)
+        else:
+            self.logging.error("Unsupported provider. Please use 'aws', 'azure', 'gcp' or 'knative'.")
+            sys.exit(1)
+
+    @staticmethod
+    def _build_workers(native: bool) -> int:
+        """Parallel Maven builds that fit into the cores and the physical memory of this machine."""
+        cores = os.cpu_count() or 1
+        try:
+            memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        except (AttributeError, ValueError, OSError):
+            return cores
+        return max(1, min(cores, memory // BUILD_MEMORY['native' if native else 'jvm']))
+
+    def _deploy(self, provider: str, deployments: dict, benchmark_name: str, benchmark: dict, function_name: str,
+                native: bool, update: bool):
+        # Concurrent deploys must not see each other's changes, every one works on its own config and benchmark
+        config = self._config_copy()
+        benchmark = copy.deepcopy(benchmark)
+        if provider == 'gcp':
+            return self.gcp.deploy(self.root_path, config, deployments, benchmark_name, benchmark, function_name, native, update)
+        elif provider == 'aws':
+            return self.aws.deploy(self.root_path, config, deployments, benchmark_name, benchmark, function_name, native, update)
+        elif provider == 'azure':
+            return self.azure.deploy(self.root_path, config, deployments, benchmark_name, benchmark, function_name, native, update)
+        elif provider == 'knative':
+            return self.knative.deploy(self.root_path, config, deployments, benchmark_name, benchmark, function_name, native, update)
+        else:
+            self.logging.error("Unsupported provider. Please use 'aws', 'azure', 'gcp' or 'knative'.")
+            sys.exit(1)
+
+    def _function_name(self, provider: str, benchmark_name: str, native: bool) -> str:
+        """Name of the existing function of a benchmark, or a new one if it isn't deployed yet."""
+        deployment = find_deployment(benchmark_name, provider, native)
+        return deployment['function_name'] if deployment is not None else self._new_function_name(benchmark_name,
+                                                                                                  native)
+
+    @staticmethod
+    def _new_function_name(benchmark_name: str, native: bool) -> str:
+        return f'quarkus{"-native" if native else ""}-{benchmark_name}-{str(uuid.uuid4())[0:8]}'
 
 
 def common_options(f):
@@ -105,23 +309,30 @@ def cli():
 
 @cli.command()
 @common_options
-def create(provider: str, benchmarks: list, native: bool):
+@click.option('--replicas', '-r', default=None, type=click.IntRange(min=1),
+              help='Number of identical copies of every benchmark (including the primary function). Cold starts are '
+                   'collected from all copies in parallel. Existing replica groups are kept if not specified.')
+@click.option('--parallel', is_flag=True, default=False,
+              help='Build benchmarks in parallel (as many as cores and memory allow) and deploy each one as soon as '
+                   'its build is done, a few at a time per provider.')
+def create(provider: str, benchmarks: list, native: bool, replicas: Optional[int], parallel: bool):
     deployer = Deployer()
-    deployer.create(provider, benchmarks, native)
+    deployer.create(provider, benchmarks, native, replicas, parallel)
 
 
 @cli.command()
 def list():
     deployments = load_deployments()
     table = []
-    headers = ["Provider", "Runtime", "Benchmark", "Function Name", "URL"]
+    headers = ["Provider", "Runtime", "Benchmark", "Function Name", "URL", "Replicas"]
 
     for provider in deployments:
         for runtime in deployments[provider]:
             for benchmark in deployments[provider][runtime]:
                 function_name = deployments[provider][runtime][benchmark]['function_name']
                 url = deployments[provider][runtime][benchmark]['url']
-                table.append([provider, runtime, benchmark, function_name, url])
+                replicas = len(deployments[provider][runtime][benchmark].get('replicas', []))
+                table.append([provider, runtime, benchmark, function_name, url, replicas])
 
     print(tabulate(table, headers, tablefmt="pretty"))
 
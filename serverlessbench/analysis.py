@@ -0,0 +1,338 @@
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from tabulate import tabulate
+
+from serverlessbench.manifest import RUNS_DIR
+from serverlessbench.results import SUMMARY_SUFFIXES, read_results
+from serverlessbench.store import STORE_DIR, ds, load_catalog, load_results, pa
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# (provider, runtime, benchmark, memory, load profile) of one cell of the results, memory is None for providers
+# without configurable memory (Azure)
+Cell = Tuple[str, str, str, Optional[int], str]
+
+METRICS = ('client_time', 'provider_time', 'results_time')
+PERCENTILES = (50, 90, 99, 99.9)
+BOOTSTRAP_RESAMPLES = 1000
+# Larger cells are bootstrapped from subsamples of this size, the intervals are rescaled to the full sample size
+MAX_BOOTSTRAP_SAMPLE = 1000
+_BOOTSTRAP_CHUNK = 4_000_000  # resampled values held in memory at a time
+# Parts of a cold invocation: network and platform overhead (client - provider time), runtime and framework
+# initialization (provider - handler time) and the handler itself (results_time measured by the wrapper)
+COLD_START_COMPONENTS = ('network_platform', 'initialization', 'handler')
+
+
+class Samples:
+    """
+    Invocation results as NumPy arrays, one entry per invocation.
+    `cell` holds the index into `cells` of every invocation, `is_cold` is 1 for cold, 0 for warm and -1 for unknown
+    invocations, every metric is a float array with NaN where the value is missing (e.g. not enriched).
+    """
+
+    def __init__(self, cells: List[Cell], cell: 'np.ndarray', is_cold: 'np.ndarray', metrics: Dict[str, 'np.ndarray']):
+        self.cells = cells
+        self.cell = cell
+        self.is_cold = is_cold
+        self.metrics = metrics
+
+    def __len__(self) -> int:
+        return len(self.cell)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('numpy is required to analyze benchmark results.')
+
+
+def samples_from_table(table) -> Samples:
+    """Convert a table of the columnar results store (see store.SCHEMA) without going through Python objects."""
+    _require_numpy()
+    keys = ['provider', 'runtime', 'benchmark', 'memory', 'load_profile']
+    codes = np.zeros(table.num_rows, dtype=np.int64)
+    labels = []
+    for key in keys:
+        # Dictionary encoding turns the (repeated) labels into small integer codes, combined into one code per cell
+        encoded = table.column(key).combine_chunks().dictionary_encode()
+        dictionary = encoded.dictionary.to_pylist() + [None]
+        indices = encoded.indices.fill_null(len(dictionary) - 1).to_numpy(zero_copy_only=False).astype(np.int64)
+        codes = codes * len(dictionary) + indices
+        labels.append(dictionary)
+
+    unique_codes, cell = np.unique(codes, return_inverse=True)
+    cells = []
+    for code in unique_codes.tolist():
+        cell_labels = []
+        for dictionary in reversed(labels):
+            code, index = divmod(code, len(dictionary))
+            cell_labels.append(dictionary[index])
+        cells.append(tuple(reversed(cell_labels)))
+
+    is_cold = table.column('is_cold').combine_chunks()
+    is_cold = np.where(is_cold.is_null().to_numpy(zero_copy_only=False), -1,
+                       is_cold.fill_null(False).to_numpy(zero_copy_only=False).astype(np.int8)).astype(np.int8)
+    metrics = {metric: table.column(metric).combine_chunks().to_numpy(zero_copy_only=False).astype(np.float64)
+               for metric in METRICS}
+    return Samples(cells, cell.astype(np.int64), is_cold, metrics)
+
+
+def samples_from_files(files: Iterable[Tuple[Cell, str]]) -> Samples:
+    """Read JSONL results files, each holding the invocations of one cell. Failed invocations are left out."""
+    _require_numpy()
+    cells, cell_arrays, cold_arrays = [], [], []
+    metric_arrays = {metric: [] for metric in METRICS}
+    for cell, path in files:
+        is_cold = []
+        values = {metric: [] for metric in METRICS}
+        for record in read_results(path):
+            if record.get('error') is not None:
+                continue
+            response_body = record.get('response_body')
+            if not isinstance(response_body, dict):
+                response_body = {}  # Non-JSON responses, e.g. error pages
+            cold = response_body.get('is_cold')
+            is_cold.append(-1 if cold is None else int(bool(cold)))
+            for metric in METRICS:
+                value = record.get(metric) if metric != 'results_time' else response_body.get(metric)
+                values[metric].append(math.nan if value is None else value)
+        cell_arrays.append(np.full(len(is_cold), len(cells), dtype=np.int64))
+        cold_arrays.append(np.asarray(is_cold, dtype=np.int8))
+        for metric in METRICS:
+            metric_arrays[metric].append(np.asarray(values[metric], dtype=np.float64))
+        cells.append(cell)
+
+    if not cells:
+        return Samples([], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8),
+                       {metric: np.zeros(0) for metric in METRICS})
+    return Samples(cells, np.concatenate(cell_arrays), np.concatenate(cold_arrays),
+                   {metric: np.concatenate(arrays) for metric, arrays in metric_arrays.items()})
+
+
+def find_result_files(results_root: str, extensions: Tuple[str, ...] = ('.jsonl',)) -> Iterable[Tuple[Cell, str]]:
+    """
+    JSONL results files below `results_root` (<provider>/<runtime>/<benchmark>/<PROFILE>_<reps>_<memory>.jsonl).
+    Files whose memory suffix is neither a number nor "default" (e.g. the format example in the repository) are
+    skipped.
+    """
+    for root, dirs, files in os.walk(results_root):
+        dirs[:] = sorted(d for d in dirs if d not in (STORE_DIR, RUNS_DIR))
+        for file in sorted(files):
+            if not file.endswith(extensions) or file.endswith(SUMMARY_SUFFIXES):
+                continue
+            parts = os.path.relpath(root, results_root).split(os.sep)
+            if len(parts) != 3:
+                continue
+            provider, runtime, benchmark = parts
+            name_parts = os.path.splitext(file)[0].split('_')
+            if name_parts[-1] != 'default' and not name_parts[-1].isdigit():
+                continue
+            memory = None if name_parts[-1] == 'default' else int(name_parts[-1])
+            yield (provider, runtime, benchmark, memory, name_parts[0]), os.path.join(root, file)
+
+
+def load_samples(results_root: str, **criteria) -> Samples:
+    """
+    Load the results of successful invocations, from the columnar store if it is available, otherwise from the
+    JSONL files. `criteria` select store files by their catalog entry (e.g. run_id=...). The JSONL files only hold
+    the latest run of every target, so run_id is ignored for them.
+    """
+    if pa is not None and load_catalog(results_root):
+        return samples_from_table(load_results(results_root, columns=[
+            'provider', 'runtime', 'benchmark', 'memory', 'load_profile', 'is_cold', *METRICS],
+            filter=ds.field('error').is_null(), **criteria))
+    file_criteria = {key: value for key, value in criteria.items() if key != 'run_id'}
+    keys = ['provider', 'runtime', 'benchmark', 'memory', 'load_profile']
+    return samples_from_files((cell, path) for cell, path in find_result_files(results_root)
+                              if all(cell[keys.index(key)] == value for key, value in file_criteria.items()))
+
+
+def _bootstrap(values: 'np.ndarray', rng: 'np.random.Generator', resamples: int,
+               confidence: float) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """Basic bootstrap intervals of the mean and the median."""
+    n = values.size
+    mean, median = float(values.mean()), float(np.median(values))
+    if n < 2 or resamples < 1:
+        return (mean, mean), (median, median)
+
+    # m-out-of-n bootstrap: the spread of statistics over subsamples of size m shrinks with sqrt(m / n)
+    size = min(n, MAX_BOOTSTRAP_SAMPLE)
+    scale = math.sqrt(size / n)
+    means = np.empty(resamples)
+    medians = np.empty(resamples)
+    chunk = max(1, _BOOTSTRAP_CHUNK // size)
+    for start in range(0, resamples, chunk):
+        count = min(chunk, resamples - start)
+        draws = values[rng.integers(0, n, size=(count, size))]
+        means[start:start + count] = draws.mean(axis=1)
+        medians[start:start + count] = np.median(draws, axis=1)
+
+    alpha = (1 - confidence) / 2
+
+    def interval(estimate: float, statistics: 'np.ndarray') -> Tuple[float, float]:
+        low, high = np.quantile((statistics - estimate) * scale, [alpha, 1 - alpha])
+        return estimate + float(low), estimate + float(high)
+
+    return interval(mean, means), interval(median, medians)
+
+
+def describe(values: 'np.ndarray', rng: 'np.random.Generator', resamples: int = BOOTSTRAP_RESAMPLES,
+             confidence: float = 0.95) -> Dict[str, Any]:
+    """Count, mean, standard deviation, percentiles and bootstrap intervals of the mean and median of a sample."""
+    percentiles = np.percentile(values, PERCENTILES)
+    mean_ci, p50_ci = _bootstrap(values, rng, resamples, confidence)
+    return {
+        'count': int(values.size),
+        'mean': float(values.mean()),
+        'std': float(values.std(ddof=1)) if values.size > 1 else 0.0,
+        **{f'p{percentile:g}': float(value) for percentile, value in zip(PERCENTILES, percentiles)},
+        'mean_ci': list(mean_ci),
+        'p50_ci': list(p50_ci),
+    }
+
+
+def summarize(samples: Samples, metrics: Sequence[str] = METRICS, resamples: int = BOOTSTRAP_RESAMPLES,
+              confidence: float = 0.95, seed: Optional[int] = 0) -> List[Dict[str, Any]]:
+    """
+    Statistics of every (cell, split, metric), where split is 'all', 'cold' or 'warm'.
+    The invocations are grouped with a single sort, every statistic is then computed on contiguous arrays.
+    """
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    order = np.argsort(samples.cell, kind='stable')
+    bounds = np.searchsorted(samples.cell[order], np.arange(len(samples.cells) + 1))
+
+    rows = []
+    for index, (provider, runtime, benchmark, memory, load_profile) in enumerate(samples.cells):
+        cell_rows = order[bounds[index]:bounds[index + 1]]
+        is_cold = samples.is_cold[cell_rows]
+        for split, split_rows in (('all', cell_rows), ('cold', cell_rows[is_cold == 1]),
+                                  ('warm', cell_rows[is_cold == 0])):
+            for metric in metrics:
+                values = samples.metrics[metric][split_rows]
+                values = values[~np.isnan(values)]
+                if values.size == 0:
+                    continue
+                rows.append({'provider': provider, 'runtime': runtime, 'benchmark': benchmark, 'memory': memory,
+                             'load_profile': load_profile, 'split': split, 'metric': metric,
+                             **describe(values, rng, resamples, confidence)})
+    return rows
+
+
+def decompose_cold_starts(samples: Samples) -> List[Dict[str, Any]]:
+    """
+    Split the cold invocations of every (provider, benchmark, memory, runtime) into COLD_START_COMPONENTS, across
+    load profiles. Only cold invocations with all three times (i.e. enriched with the provider time) are used.
+    On AWS the provider time is the Lambda Duration, which excludes the Init Duration, so the initialization is
+    counted as platform overhead there.
+    """
+    _require_numpy()
+    client, provider, handler = (samples.metrics[metric] for metric in METRICS)
+    complete = (samples.is_cold == 1) & ~np.isnan(client) & ~np.isnan(provider) & ~np.isnan(handler)
+    components = {
+        'network_platform': client - provider,
+        'initialization': provider - handler,
+        'handler': handler,
+    }
+
+    groups: Dict[Tuple[str, str, Optional[int], str], List[int]] = {}
+    for index, (provider_name, runtime, benchmark, memory, _) in enumerate(samples.cells):
+        groups.setdefault((provider_name, benchmark, memory, runtime), []).append(index)
+    keys = sorted(groups, key=lambda key: (key[0], key[1], key[2] is None, key[2] or 0, key[3]))
+    group_of_cell = np.zeros(len(samples.cells), dtype=np.int64)
+    for group, key in enumerate(keys):
+        group_of_cell[groups[key]] = group
+
+    rows_index = np.flatnonzero(complete)
+    group = group_of_cell[samples.cell[rows_index]]
+    order = np.argsort(group, kind='stable')
+    bounds = np.searchsorted(group[order], np.arange(len(keys) + 1))
+
+    rows = []
+    for index, (provider_name, benchmark, memory, runtime) in enumerate(keys):
+        group_rows = rows_index[order[bounds[index]:bounds[index + 1]]]
+        if group_rows.size == 0:
+            continue
+        client_mean = float(client[group_rows].mean())
+        row = {'provider': provider_name, 'benchmark': benchmark, 'memory': memory, 'runtime': runtime,
+               'cold_starts': int(group_rows.size),
+               'client_time': {'mean': client_mean, 'p50': float(np.median(client[group_rows]))}}
+        for component in COLD_START_COMPONENTS:
+            values = components[component][group_rows]
+            row[component] = {'mean': float(values.mean()), 'p50': float(np.median(values)),
+                              'share': float(values.mean()) / client_mean if client_mean else None}
+        rows.append(row)
+    return rows
+
+
+def format_cold_start_decomposition(rows: List[Dict[str, Any]]) -> str:
+    """
+    Median cold start components with the runtimes (JVM and native first) side by side, per memory size.
+    The share of every component is its mean over the mean client time, so the shares of a cell add up to 100%.
+    """
+    runtimes = sorted({row['runtime'] for row in rows},
+                      key=lambda runtime: (['jvm', 'native'].index(runtime) if runtime in ('jvm', 'native') else 2,
+                                           runtime))
+    by_target: Dict[Tuple[str, str, Optional[int]], Dict[str, Dict[str, Any]]] = {}
+    for row in rows:
+        by_target.setdefault((row['provider'], row['benchmark'], row['memory']), {})[row['runtime']] = row
+
+    def side_by_side(target_rows: Dict[str, Dict[str, Any]], value) -> str:
+        return ' / '.join(value(target_rows[runtime]) if runtime in target_rows else '-' for runtime in runtimes)
+
+    def seconds(key: str):
+        return lambda row: f"{row[key]['p50']:.3f} ({row[key]['share']:.0%})" if row[key]['share'] is not None \
+            else f"{row[key]['p50']:.3f}"
+
+    column = ' / '.join(runtimes)
+    headers = ['Provider', 'Benchmark', 'Memory', f'Cold Starts ({column})', f'Network + Platform (s, {column})',
+               f'Initialization (s, {column})', f'Handler (s, {column})', f'Client (s, {column})']
+    table = [[provider, benchmark, memory or 'default',
+              side_by_side(target_rows, lambda row: str(row['cold_starts'])),
+              side_by_side(target_rows, seconds('network_platform')),
+              side_by_side(target_rows, seconds('initialization')),
+              side_by_side(target_rows, seconds('handler')),
+              side_by_side(target_rows, lambda row: f"{row['client_time']['p50']:.3f}")]
+             for (provider, benchmark, memory), target_rows in by_target.items()]
+    return tabulate(table, headers=headers, tablefmt='pretty')
+
+
+def format_summary(rows: List[Dict[str, Any]], metric: str = 'client_time') -> str:
+    headers = ['Provider', 'Runtime', 'Benchmark', 'Memory', 'Profile', 'Split', 'N', 'Mean (s)', 'Std (s)',
+               'p50 (s)', 'p90 (s)', 'p99 (s)', 'p99.9 (s)', 'Mean 95% CI (s)']
+    table = [[row['provider'], row['runtime'], row['benchmark'], row['memory'] or 'default', row['load_profile'],
+              row['split'], row['count'], f"{row['mean']:.4f}", f"{row['std']:.4f}", f"{row['p50']:.4f}",
+              f"{row['p90']:.4f}", f"{row['p99']:.4f}", f"{row['p99.9']:.4f}",
+              f"{row['mean_ci'][0]:.4f} - {row['mean_ci'][1]:.4f}"]
+             for row in rows if row['metric'] == metric]
+    return tabulate(table, headers=headers, tablefmt='pretty')
+
+
+def main():
+    base_path = 'benchmark_results'
+    samples = load_samples(base_path)
+    if len(samples) == 0:
+        print("No data found.")
+        return
+    rows = summarize(samples)
+    with open('benchmark_summary.json', 'w') as f:
+        json.dump(rows, f, indent=4)
+    print(format_summary(rows))
+    print("Summary saved to benchmark_summary.json")
+
+    cold_starts = decompose_cold_starts(samples)
+    if cold_starts:
+        with open('cold_start_decomposition.json', 'w') as f:
+            json.dump(cold_starts, f, indent=4)
+        print("Cold start decomposition (median, share of the mean client time):")
+        print(format_cold_start_decomposition(cold_starts))
+        print("Cold start decomposition saved to cold_start_decomposition.json")
+
+
+if __name__ == "__main__":
+    main()
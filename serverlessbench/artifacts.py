@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import stat
+import threading
+from typing import Optional, Tuple
+
+from serverlessbench.utils import BUILD_CACHE_DIR, compute_directory_hash, find_cache, list_directory_digests, \
+    update_cache
+
+# Build outputs by content: every file once under its SHA-256, and one manifest per build listing its files
+OBJECTS_DIR = os.path.join(BUILD_CACHE_DIR, 'objects')
+MANIFESTS_DIR = os.path.join(BUILD_CACHE_DIR, 'manifests')
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(OBJECTS_DIR, digest[:2], digest)
+
+
+def _manifest_path(target_hash: str) -> str:
+    return os.path.join(MANIFESTS_DIR, f'{target_hash}.json')
+
+
+def _atomic_copy(source: str, destination: str):
+    temp_path = f'{destination}.{os.getpid()}.{threading.get_ident()}.tmp'
+    shutil.copyfile(source, temp_path)
+    os.replace(temp_path, destination)
+
+
+def store_artifacts(directory_path: str, target_hash: str):
+    """
+    Keep the build output in `directory_path` (a benchmark's target/ directory) under its directory hash.
+    Files already stored by an earlier build, e.g. dependencies shared by the JVM and native profiles, aren't copied
+    again.
+    """
+    if os.path.exists(_manifest_path(target_hash)):
+        return
+    files = []
+    for relative_path, digest in list_directory_digests(directory_path):
+        source = os.path.join(directory_path, *relative_path.split('/'))
+        if not os.path.exists(_object_path(digest)):
+            os.makedirs(os.path.dirname(_object_path(digest)), exist_ok=True)
+            _atomic_copy(source, _object_path(digest))
+        files.append({'path': relative_path, 'digest': digest, 'mode': stat.S_IMODE(os.stat(source).st_mode)})
+
+    os.makedirs(MANIFESTS_DIR, exist_ok=True)
+    temp_path = f'{_manifest_path(target_hash)}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(files, f)
+    os.replace(temp_path, _manifest_path(target_hash))
+
+
+def restore_artifacts(directory_path: str, target_hash: Optional[str]) -> bool:
+    """
+    Replace `directory_path` with the build output stored under `target_hash`.
+    Returns False, leaving the directory untouched, if that build isn't (completely) in the store.
+    """
+    if not target_hash or not os.path.exists(_manifest_path(target_hash)):
+        return False
+    with open(_manifest_path(target_hash), 'r') as f:
+        files = json.load(f)
+    if not all(os.path.exists(_object_path(entry['digest'])) for entry in files):
+        return False
+
+    shutil.rmtree(directory_path, ignore_errors=True)
+    for entry in files:
+        destination = os.path.join(directory_path, *entry['path'].split('/'))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(_object_path(entry['digest']), destination)
+        os.chmod(destination, entry['mode'])
+    return True
+
+
+def needs_build(provider: str, benchmark_name: str, native: bool, submodule_path: str, logger=None) -> bool:
+    """
+    Whether the target/ directory of a benchmark is out of date for the build profile of `provider`.
+    If the sources didn't change but target/ holds the output of another profile, the stored build of this profile
+    is restored instead.
+    """
+    target_path = os.path.join(submodule_path, 'target')
+    src_hash = compute_directory_hash(os.path.join(submodule_path, 'src'))
+    target_hash = compute_directory_hash(target_path) if os.path.exists(target_path) else None
+    cache = find_cache(provider, benchmark_name, native)
+
+    if not cache or cache['src_hash'] != src_hash:
+        return True
+    if cache['target_hash'] == target_hash:
+        return False
+    if restore_artifacts(target_path, cache['target_hash']):
+        if logger is not None:
+            logger.info(f'Restored the {f"{provider}-native" if native else provider} build of "{benchmark_name}" '
+                        f'from the artifact cache.')
+        return False
+    return True
+
+
+def record_build(provider: str, benchmark_name: str, native: bool, submodule_path: str) -> Tuple[str, str]:
+    """Update the build cache and the artifact store after a build, returns the (src, target) hashes."""
+    target_path = os.path.join(submodule_path, 'target')
+    src_hash = compute_directory_hash(os.path.join(submodule_path, 'src'))
+    target_hash = compute_directory_hash(target_path)
+    update_cache(provider, benchmark_name, native, src_hash, target_hash)
+    store_artifacts(target_path, target_hash)
+    return src_hash, target_hash
@@ -5,15 +5,45 @@ import platform
 import json
 import time
 import math
-from typing import Dict, Union, cast
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union, cast
 from serverlessbench.logger import LoggingBase
-from serverlessbench.utils import execute, compute_directory_hash, find_cache, update_cache, load_config
+from serverlessbench.poller import ReadinessPoller
+from serverlessbench.artifacts import needs_build, record_build
+from serverlessbench.utils import execute, load_config
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+except ImportError:
+    boto3 = None
 
 
 class AWS(LoggingBase):
+    MAX_LOG_GROUPS_PER_QUERY = 50  # CloudWatch Logs Insights limit
+    MAX_RESULTS_PER_QUERY = 10000  # CloudWatch Logs Insights limit, a query returns no more rows than this
+
     def __init__(self):
         super().__init__()
         self.mvwn = 'mvnw.cmd' if platform.system() == 'Windows' else 'mvnw'
+        self.log_poller = ReadinessPoller('aws')
+        # boto3 clients by (service, region), created once and shared by all threads. Without boto3 every call falls
+        # back to the aws CLI.
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._clients_lock = threading.Lock()
+
+    def _get_client(self, service: str, region: str) -> Optional[Any]:
+        if boto3 is None:
+            return None
+        with self._clients_lock:
+            if (service, region) not in self._clients:
+                self._clients[(service, region)] = boto3.session.Session().client(
+                    service, region_name=region, config=BotoConfig(retries={'mode': 'adaptive'}))
+            return self._clients[(service, region)]
+
+    def _wait_for_update(self, lambda_client, function_name: str):
+        lambda_client.get_waiter('function_updated_v2').wait(FunctionName=function_name,
+                                                             WaiterConfig={'Delay': 1, 'MaxAttempts': 300})
 
     def deploy(self, root_path, config, deployments, benchmark_name, benchmark, function_name, native, update):
         self.__precheck()
@@ -36,17 +66,7 @@ class AWS(LoggingBase):
         role = config['providers']['aws']['lambda-role']
         region = config['providers']['aws']['region']
 
-        src_hash = compute_directory_hash(os.path.join(submodule_path, 'src'))
-        target_hash = compute_directory_hash(os.path.join(submodule_path, 'target')) if os.path.exists(
-            os.path.join(submodule_path, 'target')) else None
-        cache = find_cache('aws', benchmark_name, native)
-
-        if not cache or cache['src_hash'] != src_hash or cache['target_hash'] != target_hash:
-            self.build(root_path, benchmark_name, submodule_path, native)
-            target_hash = compute_directory_hash(os.path.join(submodule_path, 'target'))
-            update_cache('aws', benchmark_name, native, src_hash, target_hash)
-        else:
-            self.logging.warning(f"Skipping build for {'aws-native' if native else 'aws'}. No changes detected.")
+        self.build_if_changed(root_path, config, benchmark_name, function_name, native)
 
         if update:
             self.update_lambda_code(function_name, submodule_path, region)
@@ -63,6 +83,14 @@ class AWS(LoggingBase):
 
         return deployments, config
 
+    def build_if_changed(self, root_path, config, benchmark_name, function_name, native):
+        submodule_path = os.path.join(root_path, "benchmarks", benchmark_name)
+        if needs_build('aws', benchmark_name, native, submodule_path, self.logging):
+            self.build(root_path, benchmark_name, submodule_path, native)
+            record_build('aws', benchmark_name, native, submodule_path)
+        else:
+            self.logging.warning(f"Skipping build for {'aws-native' if native else 'aws'}. No changes detected.")
+
     def build(self, root_path, benchmark_name, submodule_path, native):
         mvnw_path = os.path.join(root_path, self.mvwn)
         profile = 'aws-native' if native else 'aws'
@@ -164,6 +192,12 @@ class AWS(LoggingBase):
         region = config['providers']['aws'].get('region')
 
         self.logging.info(f'Updating "{function_name}" memory on AWS Lambda.')
+        lambda_client = self._get_client('lambda', region)
+        if lambda_client is not None:
+            lambda_client.update_function_configuration(FunctionName=function_name, MemorySize=int(memory))
+            self._wait_for_update(lambda_client, function_name)
+            return
+
         execute([
             'aws', 'lambda', 'update-function-configuration',
             '--function-name', function_name,
@@ -178,6 +212,16 @@ class AWS(LoggingBase):
         config = load_config()
         region = config['providers']['aws'].get('region')
 
+        lambda_client = self._get_client('lambda', region)
+        if lambda_client is not None:
+            configuration = lambda_client.get_function_configuration(FunctionName=function_name)
+            env_vars = configuration.get('Environment', {}).get('Variables', {})
+            env_vars['cold_start_var'] = str(int(env_vars.get('cold_start_var', '0')) + 1)
+            lambda_client.update_function_configuration(FunctionName=function_name,
+                                                        Environment={'Variables': env_vars})
+            self._wait_for_update(lambda_client, function_name)
+            return
+
         env_vars = execute([
             'aws', 'lambda', 'get-function-configuration',
             '--function-name', function_name,
@@ -278,20 +322,36 @@ class AWS(LoggingBase):
             self.logging.error('aws CLI is not installed. Please install it before proceeding.')
             sys.exit(1)
 
-    def start_aws_query(self, function_name: str, start_time: int, end_time: int, region: str):
+    def start_aws_query(self, function_names: List[str], start_time: int, end_time: int, region: str):
+        logs_client = self._get_client('logs', region)
+        if logs_client is not None:
+            return logs_client.start_query(logGroupNames=[f"/aws/lambda/{function_name}"
+                                                          for function_name in function_names],
+                                           queryString="filter @message like /REPORT/",
+                                           startTime=math.floor(start_time), endTime=math.ceil(end_time + 1),
+                                           limit=self.MAX_RESULTS_PER_QUERY)["queryId"]
+
         query_response = execute([
             "aws", "logs", "start-query",
-            "--log-group-name", f"/aws/lambda/{function_name}",
+            "--log-group-names", *[f"/aws/lambda/{function_name}" for function_name in function_names],
             "--query-string", "filter @message like /REPORT/",
             "--start-time", str(math.floor(start_time)),
             "--end-time", str(math.ceil(end_time + 1)),
-            "--limit", "10000",
+            "--limit", str(self.MAX_RESULTS_PER_QUERY),
             "--region", region,
             "--output", "json"
         ], "Error while starting AWS query.", self.logging)
         return json.loads(query_response)["queryId"]
 
     def get_aws_query_results(self, query_id: str, region: str):
+        logs_client = self._get_client('logs', region)
+        if logs_client is not None:
+            # An API call costs milliseconds, so the query can be checked more often than with the CLI
+            while (response := logs_client.get_query_results(queryId=query_id))["status"] in ("Scheduled",
+                                                                                            "Running"):
+                time.sleep(0.25)
+            return response["results"]
+
         response = None
         while response is None or json.loads(response)["status"] == "Running":
             self.logging.info("Waiting for AWS query to complete ...")
@@ -310,7 +370,9 @@ class AWS(LoggingBase):
             for result_part in val:
                 if result_part["field"] == "@message":
                     request_id = self.parse_aws_report(result_part["value"], requests)
-                    if request_id in requests:
+                    # The queried window also holds invocations that aren't part of the results (warm-ups, cold
+                    # misses, priming calls), and a request may be reported more than once
+                    if request_id in requests_ids:
                         results_processed += 1
                         requests_ids.remove(request_id)
 
@@ -326,33 +388,61 @@ class AWS(LoggingBase):
             request_id = aws_vals["START RequestId"]
         else:
             request_id = aws_vals["REPORT RequestId"]
+        if request_id not in requests:
+            return request_id
         if isinstance(requests, dict):
             output = requests
         else:
-            if request_id not in requests:
-                return request_id
             output = requests[request_id]
         output[request_id]["provider_time"] = float(aws_vals["Duration"]) / 1000
 
         return request_id
 
     def enrich_metrics(self, function_name: str, start_time: int, end_time: int, requests: Dict[str, dict]):
-        region = load_config()['providers']['aws'].get('region')
-        time.sleep(100)
-
-        results_count = len(requests.keys())
-        results_processed = 0
-
-        while results_processed < results_count:
-            query_id = self.start_aws_query(function_name, start_time, end_time, region)
-            results = self.get_aws_query_results(query_id, region)
-            results_processed = self.process_query_results(results, requests)
-
-            self.logging.info(
-                f"Received {len(results)} entries, found results for {results_processed} out of {results_count} invocations")
-
-            if results_processed < results_count:
-                self.logging.info("Re-querying AWS logs for missing invocations...")
-                time.sleep(10)
-
+        self.enrich_metrics_batch([(function_name, start_time, end_time, requests)])
         return requests
+
+    def _query_reports(self, function_names: List[str], start_time: float, end_time: float, region: str,
+                       requests: Dict[str, dict]):
+        """
+        Query the REPORT lines of the functions between start_time and end_time. A query that hits the result limit
+        may have cut off some of them, so its time range is split in half and both halves are queried instead.
+        """
+        query_id = self.start_aws_query(function_names, start_time, end_time, region)
+        results = self.get_aws_query_results(query_id, region)
+        if len(results) >= self.MAX_RESULTS_PER_QUERY:
+            if end_time - start_time > 1:  # Insights queries have a resolution of a second
+                middle = (start_time + end_time) / 2
+                self._query_reports(function_names, start_time, middle, region, requests)
+                self._query_reports(function_names, middle, end_time, region, requests)
+                return
+            self.logging.warning(f"More than {self.MAX_RESULTS_PER_QUERY} REPORT lines within a second, "
+                                 f"some invocations can't be enriched.")
+        self.logging.debug(f"Received {len(results)} entries from CloudWatch Logs Insights.")
+        self.process_query_results(results, requests)
+
+    def enrich_metrics_batch(self, windows: List[Tuple[str, float, float, Dict[str, dict]]]):
+        """
+        Set the provider time of every request in the given (function name, start, end, requests) windows.
+        The log groups of the windows with unresolved requests are covered by one CloudWatch Logs Insights query per
+        50 functions, split by time while it exceeds the result limit, and repeated with backoff until every request
+        was found.
+        """
+        region = load_config()['providers']['aws'].get('region')
+        requests = {request_id: record for _, _, _, window_requests in windows
+                    for request_id, record in window_requests.items()}
+        end_time = max(window_end for _, _, window_end, _ in windows)
+
+        def query() -> int:
+            # Windows that are complete are not queried again
+            pending = [window for window in windows
+                       if any(record.get('provider_time') is None for record in window[3].values())]
+            function_names = sorted(set(function_name for function_name, _, _, _ in pending))
+            for i in range(0, len(function_names), self.MAX_LOG_GROUPS_PER_QUERY):
+                names = function_names[i:i + self.MAX_LOG_GROUPS_PER_QUERY]
+                group = [window for window in pending if window[0] in names]
+                self._query_reports(names, min(window[1] for window in group), max(window[2] for window in group),
+                                    region, requests)
+            return sum(1 for record in requests.values() if record.get('provider_time') is not None)
+
+        self.log_poller.poll(query, expected=len(requests), window_end=end_time)
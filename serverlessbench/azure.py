@@ -7,15 +7,47 @@ import time
 import datetime
 from tzlocal import get_localzone
 
-from typing import Dict
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 from serverlessbench.logger import LoggingBase
-from serverlessbench.utils import execute, compute_directory_hash, find_cache, update_cache, load_config
+from serverlessbench.poller import ReadinessPoller
+from serverlessbench.artifacts import needs_build, record_build
+from serverlessbench.utils import execute, load_config
+
+try:
+    from azure.identity import DefaultAzureCredential
+    from azure.mgmt.applicationinsights import ApplicationInsightsManagementClient
+    from azure.mgmt.web import WebSiteManagementClient
+    from azure.monitor.query import LogsQueryClient
+except ImportError:
+    DefaultAzureCredential = None
 
 
 class Azure(LoggingBase):
     def __init__(self):
         super().__init__()
         self.mvwn = 'mvnw.cmd' if platform.system() == 'Windows' else 'mvnw'
+        self.log_poller = ReadinessPoller('azure')
+        self.application_ids: Dict[str, str] = {}  # App Insights application id by function name
+        self.application_resource_ids: Dict[str, str] = {}  # App Insights resource id by function name
+        # Azure SDK clients, created once. Without the SDKs or a configured subscription every call falls back to
+        # the az CLI.
+        self._clients: Optional[Dict[str, Any]] = None
+        self._clients_lock = threading.Lock()
+
+    def _get_clients(self) -> Optional[Dict[str, Any]]:
+        subscription = load_config()['providers']['azure'].get('subscription')
+        if DefaultAzureCredential is None or subscription is None:
+            return None
+        with self._clients_lock:
+            if self._clients is None:
+                credential = DefaultAzureCredential()
+                self._clients = {
+                    'web': WebSiteManagementClient(credential, subscription),
+                    'insights': ApplicationInsightsManagementClient(credential, subscription),
+                    'logs': LogsQueryClient(credential),
+                }
+            return self._clients
 
     def deploy(self, root_path, config, deployments, benchmark_name, benchmark, function_name, native, update):
         self.__precheck()
@@ -29,17 +61,7 @@ class Azure(LoggingBase):
         resource_group = config['providers']['azure'].get('resource-group')
         app_service_plan_name = config['providers']['azure'].get('app-service-plan-name')
 
-        src_hash = compute_directory_hash(os.path.join(submodule_path, 'src'))
-        target_hash = compute_directory_hash(os.path.join(submodule_path, 'target')) if os.path.exists(
-            os.path.join(submodule_path, 'target')) else None
-        cache = find_cache('azure', benchmark_name, native)
-
-        if not cache or cache['src_hash'] != src_hash or cache['target_hash'] != target_hash:
-            self.build(mvnw_path, benchmark_name, submodule_path, function_name, native)
-            target_hash = compute_directory_hash(os.path.join(submodule_path, 'target'))
-            update_cache('azure', benchmark_name, native, src_hash, target_hash)
-        else:
-            self.logging.warning(f"Skipping build for {'azure-native' if native else 'azure'}. No changes detected.")
+        self.build_if_changed(root_path, config, benchmark_name, function_name, native)
 
         url, account_name, account_key, app_insights_instrumentation_key = self.deploy_function(function_name, mvnw_path,
                                                                                                 timeout, submodule_path, region,
@@ -60,6 +82,15 @@ class Azure(LoggingBase):
 
         return deployments, config
 
+    def build_if_changed(self, root_path, config, benchmark_name, function_name, native):
+        mvnw_path = os.path.join(root_path, self.mvwn)
+        submodule_path = os.path.join(root_path, "benchmarks", benchmark_name)
+        if needs_build('azure', benchmark_name, native, submodule_path, self.logging):
+            self.build(mvnw_path, benchmark_name, submodule_path, function_name, native)
+            record_build('azure', benchmark_name, native, submodule_path)
+        else:
+            self.logging.warning(f"Skipping build for {'azure-native' if native else 'azure'}. No changes detected.")
+
     def build(self, mvnw_path, benchmark_name, submodule_path, function_name, native):
         profile = 'azure-native' if native else 'azure'
         self.logging.info(f'Building benchmark "{benchmark_name}" with profile "{profile}".')
@@ -155,6 +186,17 @@ class Azure(LoggingBase):
         config = load_config()
         resource_group = config['providers']['azure'].get('resource_group')
 
+        clients = self._get_clients()
+        if clients is not None:
+            web_apps = clients['web'].web_apps
+            settings = web_apps.list_application_settings(resource_group if resource_group else 'quarkus',
+                                                          function_name)
+            settings.properties['cold_start_var'] = str(int(settings.properties.get('cold_start_var', '0')) + 1)
+            web_apps.update_application_settings(resource_group if resource_group else 'quarkus', function_name,
+                                                 settings)
+            time.sleep(20)
+            return
+
         env_vars = json.loads(execute([
             'az', 'functionapp', 'config', 'appsettings', 'list',
             '--name', function_name,
@@ -208,18 +250,39 @@ class Azure(LoggingBase):
         return f"{int(hours):02}:{int(minutes):02}:{int(seconds):02}"
 
     def enrich_metrics(self, function_name: str, start_time: int, end_time: int, requests: Dict[str, dict]):
-        max_retries = 10  # Maximum number of retries
-        retry_interval = 10  # Interval between retries in seconds
+        self.enrich_metrics_batch([(function_name, start_time, end_time, requests)])
+        return requests
 
-        time.sleep(100)
+    def _get_application_id(self, function_name: str, resource_group: str) -> str:
+        if function_name not in self.application_ids:
+            clients = self._get_clients()
+            if clients is not None:
+                component = clients['insights'].components.get(resource_group, function_name)
+                self.application_resource_ids[function_name] = component.id
+                self.application_ids[function_name] = component.app_id
+                return self.application_ids[function_name]
+            app_id_query = execute(['az', 'monitor', 'app-insights', 'component', 'show',
+                                    '--app', function_name,
+                                    '--resource-group', resource_group],
+                                   "Error while fetching App Insights application ID.", self.logging)
+            self.application_ids[function_name] = json.loads(app_id_query)["appId"]
+        return self.application_ids[function_name]
+
+    def enrich_metrics_batch(self, windows: List[Tuple[str, float, float, Dict[str, dict]]]):
+        """
+        Set the provider time of every request in the given (function name, start, end, requests) windows.
+        The App Insights components of all functions are covered by one cross-app query, repeated with backoff until
+        every request was found.
+        """
         resource_group = load_config()['providers']['azure'].get('resource_group')
         resource_group = resource_group if resource_group else 'quarkus'
 
-        app_id_query = execute(['az', 'monitor', 'app-insights', 'component', 'show',
-                                '--app', function_name,
-                                '--resource-group', resource_group],
-                               "Error while fetching App Insights application ID.", self.logging)
-        application_id = json.loads(app_id_query)["appId"]
+        requests = {request_id: record for _, _, _, window_requests in windows
+                    for request_id, record in window_requests.items()}
+        function_names = sorted(set(function_name for function_name, _, _, _ in windows))
+        application_ids = [self._get_application_id(function_name, resource_group) for function_name in function_names]
+        start_time = min(window_start for _, window_start, _, _ in windows)
+        end_time = max(window_end for _, _, window_end, _ in windows)
 
         start_time_str = datetime.datetime.fromtimestamp(start_time).strftime(
             "%Y-%m-%d %H:%M:%S.%f"
@@ -236,37 +299,41 @@ class Azure(LoggingBase):
         invocations_processed: set[str] = set()
         invocations_to_process = set(requests.keys())
 
-        retries = 0
-        while retries < max_retries and len(invocations_processed) < len(requests.keys()):
-            self.logging.info("Azure: Running App Insights query.")
+        def fetch_rows() -> list:
+            clients = self._get_clients()
+            if clients is not None and function_names[0] in self.application_resource_ids:
+                # One cross-app query, sent to the first component and reaching the others through app()
+                sdk_query = query.replace("requests", "union " + ", ".join(
+                    f"app('{application_id}').requests" for application_id in application_ids), 1)
+                response = clients['logs'].query_resource(
+                    self.application_resource_ids[function_names[0]], sdk_query,
+                    timespan=(datetime.datetime.fromtimestamp(start_time, tz=datetime.timezone.utc),
+                              datetime.datetime.fromtimestamp(end_time + 1, tz=datetime.timezone.utc)))
+                tables = response.tables if hasattr(response, 'tables') else response.partial_data
+                return [list(row) for row in tables[0].rows] if tables else []
+
             ret = execute(['az', 'monitor', 'app-insights', 'query',
-                           '--app', application_id,
+                           '--apps', *application_ids,
                            '--analytics-query', f"{query}",
                            '--start-time', start_time_str, timezone_str,
                            '--end-time', end_time_str, timezone_str],
                           "Error while fetching App Insights metrics.", self.logging)
-            ret = json.loads(ret)
-            ret = ret["tables"][0]
+            return json.loads(ret)["tables"][0]["rows"]
 
-            for request in ret["rows"]:
+        def run_query() -> int:
+            self.logging.info(f"Azure: Running App Insights query over {len(application_ids)} applications.")
+            for request in fetch_rows():
                 invocation_id = request[-2]
                 if invocation_id not in requests:
                     continue
                 func_exec_time = request[-1]
                 invocations_processed.add(invocation_id)
                 requests[invocation_id]["provider_time"] = float(func_exec_time) / 1000
+            return len(invocations_processed)
 
-            self.logging.info(
-                f"Found time metrics for {len(invocations_processed)} out of {len(requests.keys())} invocations."
-            )
-            if len(invocations_processed) < len(requests.keys()):
-                self.logging.info(f"Missing the requests: {invocations_to_process - invocations_processed}")
-                time.sleep(retry_interval)
-                retries += 1
-
-        if len(invocations_processed) < len(requests.keys()):
+        result = self.log_poller.poll(run_query, expected=len(requests), window_end=end_time)
+        if not result.complete:
             self.logging.warning(
-                f"Failed to find metrics for {len(invocations_to_process - invocations_processed)} invocations after {max_retries} retries."
+                f"Failed to find metrics for {len(invocations_to_process - invocations_processed)} invocations: "
+                f"{invocations_to_process - invocations_processed}"
             )
-
-        return requests
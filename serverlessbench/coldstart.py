@@ -0,0 +1,350 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from serverlessbench.invoker import FunctionInvocationResult
+from serverlessbench.logger import LoggingBase
+
+RETRY_DELAY = 5  # minimal seconds to wait before retrying a replica that answered warm
+MAX_RETRY_DELAY = 300
+MAX_ATTEMPTS = 5  # invocations one cold sample may take before it is dropped
+
+
+class ColdStartStats:
+    """Enforcement efficiency of the cold start strategy for one (provider, runtime)."""
+
+    def __init__(self):
+        self.attempts = 0  # invocations sent to get cold samples
+        self.samples = 0  # cold samples recorded
+        self.abandoned = 0  # samples dropped after their retry budget was spent
+        self.rollouts = 0  # new revisions rolled out
+        self.rollout_time = 0.0  # seconds the provider took to roll them out
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromDict(cls, data: Dict[str, Any]) -> 'ColdStartStats':
+        """Stats continuing from those saved by toDict, e.g. by an interrupted run."""
+        stats = cls()
+        stats.attempts = data.get('attempts', 0)
+        stats.samples = data.get('samples', 0)
+        stats.abandoned = data.get('abandoned', 0)
+        stats.rollouts = data.get('rollouts', 0)
+        if stats.rollouts and data.get('mean_rollout_time') is not None:
+            stats.rollout_time = data['mean_rollout_time'] * stats.rollouts
+        return stats
+
+    @property
+    def misses(self) -> int:
+        return self.attempts - self.samples
+
+    @property
+    def miss_rate(self) -> float:
+        return self.misses / self.attempts if self.attempts else 0.0
+
+    def record_attempt(self, cold: bool):
+        with self._lock:
+            self.attempts += 1
+            if cold:
+                self.samples += 1
+
+    def record_abandoned(self):
+        with self._lock:
+            self.abandoned += 1
+
+    def record_rollout(self, seconds: float):
+        with self._lock:
+            self.rollouts += 1
+            self.rollout_time += seconds
+
+    def toDict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'attempts': self.attempts,
+                'samples': self.samples,
+                'misses': self.attempts - self.samples,
+                'miss_rate': (self.attempts - self.samples) / self.attempts if self.attempts else 0.0,
+                'abandoned': self.abandoned,
+                'rollouts': self.rollouts,
+                'mean_rollout_time': self.rollout_time / self.rollouts if self.rollouts else None,
+            }
+
+
+def is_cold(result: FunctionInvocationResult) -> bool:
+    """Whether the function reported a cold start, false for failed requests and non-JSON responses."""
+    return isinstance(result.response_body, dict) and bool(result.response_body.get('is_cold'))
+
+
+class ColdStartStrategy(LoggingBase):
+    """How the instances of a function are gotten rid of before a cold start is measured."""
+
+    def prepare(self, function_name: str):
+        """Called before every invocation, returns once the next invocation is expected to be cold."""
+        raise NotImplementedError
+
+    def accept(self, function_name: str, result: FunctionInvocationResult) -> Optional[bool]:
+        """
+        Called after every invocation, decides whether the result is a cold sample.
+        None means the invocation was not an attempt at a cold sample and is not counted.
+        """
+        raise NotImplementedError
+
+    def retry(self, function_name: str, attempts: int):
+        """Called before a sample that was warm after `attempts` attempts is tried again."""
+        pass
+
+
+class RedeployStrategy(ColdStartStrategy):
+    """
+    Forces new instances by changing the function configuration before every invocation.
+    A warm answer usually means the old revision was still serving, so the wait before the next attempt grows with
+    the time the provider took to roll out the last revision and with every attempt of the sample.
+    """
+
+    def __init__(self, enforce_cold_start: Callable[[str], None], stats: Optional[ColdStartStats] = None):
+        super().__init__()
+        self.enforce_cold_start = enforce_cold_start  # function name -> None, returns once the update is live
+        self.stats = stats
+        self._rollout_times: Dict[str, float] = {}
+
+    def prepare(self, function_name: str):
+        start = time.monotonic()
+        self.enforce_cold_start(function_name)
+        self._rollout_times[function_name] = time.monotonic() - start
+        if self.stats is not None:
+            self.stats.record_rollout(self._rollout_times[function_name])
+
+    def accept(self, function_name: str, result: FunctionInvocationResult) -> bool:
+        if is_cold(result):
+            return True
+        self.logging.error(f"Expected a cold start, but it was not detected. Function: {function_name}.")
+        return False
+
+    def retry(self, function_name: str, attempts: int):
+        wait = min(MAX_RETRY_DELAY, max(RETRY_DELAY, self._rollout_times.get(function_name, 0)) * attempts)
+        self.logging.info(f"Retrying the cold start of {function_name} in {wait:.0f}s.")
+        time.sleep(wait)
+
+
+class EvictionWindowEstimator(LoggingBase):
+    """
+    Learns after how many idle seconds a provider evicts the instances of a function.
+    `warm_gap` is the longest idle gap after which an instance was still warm, `cold_gap` the shortest one after
+    which it was gone. Gaps grow by `factor` until the first eviction is seen, then the window is bisected until
+    it is known to `tolerance` seconds. Afterwards invocations are scheduled `margin` past the cold gap.
+    A warm answer past the cold gap (providers don't evict on a fixed schedule) moves the window up again.
+    """
+
+    def __init__(self, provider: str, initial_gap: float = 300.0, factor: float = 2.0, max_gap: float = 3600.0,
+                 tolerance: float = 30.0, margin: float = 0.1, warm_gap: float = 0.0,
+                 cold_gap: Optional[float] = None):
+        super().__init__()
+        self.provider = provider
+        self.initial_gap = initial_gap
+        self.factor = factor
+        self.max_gap = max_gap
+        self.tolerance = tolerance
+        self.margin = margin
+        self.warm_gap = warm_gap
+        self.cold_gap = cold_gap
+        self._lock = threading.Lock()
+
+    @property
+    def converged(self) -> bool:
+        return self.cold_gap is not None and self.cold_gap - self.warm_gap <= self.tolerance
+
+    def next_gap(self) -> float:
+        with self._lock:
+            if self.cold_gap is None:
+                return min(self.max_gap, max(self.initial_gap, self.warm_gap * self.factor))
+            if not self.converged:
+                return (self.warm_gap + self.cold_gap) / 2
+            return self.cold_gap * (1 + self.margin)
+
+    def observe(self, gap: float, is_cold: bool):
+        with self._lock:
+            if is_cold:
+                self.cold_gap = gap if self.cold_gap is None else min(self.cold_gap, gap)
+                if gap <= self.warm_gap:
+                    # Evicted earlier than an instance that survived longer before, forget the stale lower bound
+                    self.warm_gap = 0.0
+            else:
+                self.warm_gap = max(self.warm_gap, gap)
+                if self.cold_gap is not None and self.cold_gap <= self.warm_gap:
+                    self.cold_gap = None
+            self.logging.debug(f"{self.provider.upper()}: idle gap {gap:.0f}s was {'cold' if is_cold else 'warm'}, "
+                               f"eviction window now between {self.warm_gap:.0f}s and "
+                               f"{'?' if self.cold_gap is None else f'{self.cold_gap:.0f}'}s.")
+
+    def report(self) -> str:
+        with self._lock:
+            upper = 'unknown' if self.cold_gap is None else f'{self.cold_gap:.0f}s'
+            return f"{self.provider.upper()}: idle eviction window between {self.warm_gap:.0f}s and {upper}."
+
+    def toDict(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            return {'warm_gap': self.warm_gap, 'cold_gap': self.cold_gap}
+
+
+def load_eviction_windows(path: str) -> Dict[str, EvictionWindowEstimator]:
+    """Estimators of all providers, starting from the windows learned by earlier runs."""
+    learned = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            learned = json.load(f)
+    return {provider: EvictionWindowEstimator(provider, **learned.get(provider, {}))
+            for provider in ('aws', 'azure', 'gcp', 'knative')}
+
+
+def save_eviction_windows(path: str, estimators: Dict[str, EvictionWindowEstimator]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({provider: estimator.toDict() for provider, estimator in estimators.items()}, f, indent=4)
+
+
+class IdleTimeoutStrategy(ColdStartStrategy):
+    """
+    Waits until the provider evicted the idle instances instead of redeploying, so the sample is a real scale from
+    zero and no control plane call is needed. Every invocation also refines the eviction window estimate, only those
+    that turned out cold are kept. The first invocation of every function only starts its idle clock.
+    """
+
+    def __init__(self, estimator: EvictionWindowEstimator):
+        super().__init__()
+        self.estimator = estimator
+        self._last_invocation: Dict[str, float] = {}
+        self._gaps: Dict[str, float] = {}
+
+    def prepare(self, function_name: str):
+        last = self._last_invocation.get(function_name)
+        if last is None:
+            return
+        gap = self.estimator.next_gap()
+        wait = last + gap - time.monotonic()
+        if wait > 0:
+            self.logging.info(f"Waiting {wait:.0f}s for the instances of {function_name} to be evicted.")
+            time.sleep(wait)
+        self._gaps[function_name] = time.monotonic() - last
+
+    def accept(self, function_name: str, result: FunctionInvocationResult) -> Optional[bool]:
+        self._last_invocation[function_name] = time.monotonic()
+        gap = self._gaps.pop(function_name, None)
+        if gap is None:
+            return None
+        cold = is_cold(result)
+        if result.error is None:
+            # A failed request tells nothing about whether the instances were evicted
+            self.estimator.observe(gap, cold)
+        return cold
+
+
+class ColdStartPipeline(LoggingBase):
+    """
+    Collects cold start samples from a pool of identical deployments (replicas) of a function.
+    Every replica has its own worker, which lets the strategy get rid of the replica's instances and invokes it as
+    soon as that is done, then starts over with the next repetition. While one replica is being redeployed (or sits
+    idle) the others are measured, so N cold samples cost about N / pool size redeploy latencies instead of N.
+    With a single replica and the redeploy strategy it behaves exactly like enforcing a cold start before every
+    invocation.
+    """
+
+    def __init__(self, replicas: List[Dict[str, str]], strategy: ColdStartStrategy,
+                 invoke: Callable[[str], FunctionInvocationResult], max_attempts: int = MAX_ATTEMPTS,
+                 stats: Optional[ColdStartStats] = None):
+        super().__init__()
+        self.replicas = replicas  # [{'function_name': ..., 'benchmark_url': ...}]
+        self.strategy = strategy
+        self.invoke = invoke  # benchmark url -> result
+        self.max_attempts = max_attempts
+        self.stats = stats if stats is not None else ColdStartStats()
+        self._lock = threading.Lock()
+        self._claimed = 0
+        self._completed = 0
+        self._dropped = 0
+        self._budget = 0  # invocations the run may still spend
+
+    def run(self, repetitions: int, on_sample: Callable[[int, FunctionInvocationResult, int], None],
+            completed: int = 0) -> int:
+        """
+        Collect cold samples until `repetitions` were recorded, continuing after `completed` earlier samples.
+        `on_sample` receives the number of the repetition, its result and the invocations it took. Calls are
+        serialized, so it may write to files and manifests without further locking.
+        Every sample has a budget of `max_attempts` invocations, a sample that stays warm that long is dropped and
+        collected again later, so one stale replica can't stall the run. The run as a whole may spend `max_attempts`
+        invocations per missing sample, once that is used up the remaining samples are given up. Returns the number
+        of recorded samples, fewer than `repetitions` if the budget ran out.
+        """
+        self._claimed = completed
+        self._completed = completed
+        self._dropped = 0
+        self._budget = (repetitions - completed) * self.max_attempts
+        if completed >= repetitions:
+            return completed
+        workers = min(len(self.replicas), repetitions - completed)
+        self.logging.info(f"Collecting {repetitions - completed} cold starts from {workers} replicas in parallel.")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cold-start') as executor:
+            futures = [executor.submit(self._run_replica, replica, repetitions, on_sample)
+                       for replica in self.replicas[:workers]]
+            for future in futures:
+                future.result()
+
+        if self._completed < repetitions:
+            self.logging.error(f"Collected only {self._completed} out of {repetitions} cold starts, the retry budget "
+                               f"of {self.max_attempts} attempts per sample was used up after {self._dropped} "
+                               f"dropped samples.")
+        return self._completed
+
+    def _claim(self, repetitions: int) -> bool:
+        with self._lock:
+            if self._claimed >= repetitions or self._budget <= 0:
+                return False
+            self._claimed += 1
+            return True
+
+    def _spend(self) -> bool:
+        """Take one invocation from the budget of the run, False if it is used up."""
+        with self._lock:
+            if self._budget <= 0:
+                return False
+            self._budget -= 1
+            return True
+
+    def _run_replica(self, replica: Dict[str, str], repetitions: int,
+                     on_sample: Callable[[int, FunctionInvocationResult, int], None]):
+        while self._claim(repetitions):
+            # Every sample starts with a fresh retry budget
+            attempts = 0
+            cold = False
+            while attempts < self.max_attempts and self._spend():
+                if attempts:
+                    self.strategy.retry(replica['function_name'], attempts)
+                attempts += 1
+                self.strategy.prepare(replica['function_name'])
+                result = self.invoke(replica['benchmark_url'])
+                cold = self.strategy.accept(replica['function_name'], result)
+                if cold is None:
+                    # Not an attempt, its invocation goes back to the budget
+                    attempts -= 1
+                    with self._lock:
+                        self._budget += 1
+                    continue
+                self.stats.record_attempt(cold)
+                if cold:
+                    break
+
+            if not cold:
+                with self._lock:
+                    self._claimed -= 1  # Collected again while the budget of the run lasts
+                if attempts:
+                    self.logging.error(f"Dropping a cold start sample of replica {replica['function_name']}, no "
+                                       f"cold start after {attempts} attempts.")
+                    self.stats.record_abandoned()
+                    with self._lock:
+                        self._dropped += 1
+                continue
+
+            with self._lock:
+                self._completed += 1
+                on_sample(self._completed, result, attempts)
@@ -0,0 +1,215 @@
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+from tabulate import tabulate
+
+from serverlessbench.analysis import Samples, load_samples
+from serverlessbench.utils import calculate_cpu, load_config
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# List prices in USD (tier 1 regions, x86, free tiers ignored). `config.json` may override any of them per provider
+# under "pricing", e.g. {"pricing": {"aws": {"gb_second": 0.0000133334}}} for Arm functions.
+#   gb_second / vcpu_second   price of a GiB / vCPU allocated for a second of billed duration
+#   per_request               fee per invocation
+#   granularity / minimum     billed duration is rounded up to `granularity` seconds, and at least `minimum`
+#   cpu_from_memory           vCPUs are derived from memory with calculate_cpu, as deployed on GCP and Knative
+#   memory_rounding           billed memory is rounded up to a multiple of this many MiB
+#   default_memory            MiB billed for targets without configurable memory
+PRICING = {
+    'aws': {  # Lambda, billed per ms of the configured memory, CPU is included
+        'gb_second': 0.0000166667,
+        'vcpu_second': 0.0,
+        'per_request': 0.20 / 1_000_000,
+        'granularity': 0.001,
+        'minimum': 0.001,
+        'cpu_from_memory': False,
+        'memory_rounding': 1,
+        'default_memory': 128,
+    },
+    'gcp': {  # Cloud Run (functions 2nd gen), request-based billing rounded up to 100 ms
+        'gb_second': 0.0000025,
+        'vcpu_second': 0.000024,
+        'per_request': 0.40 / 1_000_000,
+        'granularity': 0.1,
+        'minimum': 0.1,
+        'cpu_from_memory': True,
+        'memory_rounding': 1,
+        'default_memory': 512,
+    },
+    'azure': {  # Consumption plan, billed on the observed memory, so the 1.5 GB instance limit is an upper bound
+        'gb_second': 0.000016,
+        'vcpu_second': 0.0,
+        'per_request': 0.20 / 1_000_000,
+        'granularity': 0.001,
+        'minimum': 0.1,
+        'cpu_from_memory': False,
+        'memory_rounding': 128,
+        'default_memory': 1536,
+    },
+    'knative': {  # Self-hosted, the requested resources for the time they are held, at GKE Autopilot pod prices
+        'gb_second': 0.0000013674,
+        'vcpu_second': 0.0000123611,
+        'per_request': 0.0,
+        'granularity': 0.001,
+        'minimum': 0.0,
+        'cpu_from_memory': True,
+        'memory_rounding': 1,
+        'default_memory': 512,
+    },
+}
+
+INVOCATIONS = 1_000_000  # costs are reported per this many invocations
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('numpy is required to compute benchmark costs.')
+
+
+def load_pricing() -> Dict[str, Dict[str, Any]]:
+    """PRICING with the overrides of the "pricing" entry of config.json, if there is one."""
+    pricing = {provider: dict(prices) for provider, prices in PRICING.items()}
+    try:
+        overrides = load_config().get('pricing', {})
+    except FileNotFoundError:
+        overrides = {}
+    for provider, prices in overrides.items():
+        pricing.setdefault(provider, {}).update(prices)
+    return pricing
+
+
+def billed_memory(prices: Dict[str, Any], memory: Optional[int]) -> int:
+    memory = memory or prices['default_memory']
+    return math.ceil(memory / prices['memory_rounding']) * prices['memory_rounding']
+
+
+def cost_per_second(prices: Dict[str, Any], memory: Optional[int]) -> float:
+    """Price of a second of billed duration of one instance with `memory` MiB."""
+    memory = billed_memory(prices, memory)
+    vcpus = calculate_cpu(memory) if prices['cpu_from_memory'] else 0.0
+    return memory / 1024 * prices['gb_second'] + vcpus * prices['vcpu_second']
+
+
+def billed_durations(prices: Dict[str, Any], durations: 'np.ndarray') -> 'np.ndarray':
+    """`durations` in seconds rounded up to the billing granularity and minimum."""
+    _require_numpy()
+    # The small tolerance keeps durations that are exact multiples of the granularity from being rounded up
+    billed = np.ceil(durations / prices['granularity'] - 1e-9) * prices['granularity']
+    return np.maximum(billed, prices['minimum'])
+
+
+def invocation_costs(prices: Dict[str, Any], memory: Optional[int], durations: 'np.ndarray') -> 'np.ndarray':
+    """Cost of every invocation of `durations` seconds."""
+    return billed_durations(prices, durations) * cost_per_second(prices, memory) + prices['per_request']
+
+
+def cost_table(samples: Samples, pricing: Optional[Dict[str, Dict[str, Any]]] = None,
+               latency_percentile: float = 99) -> List[Dict[str, Any]]:
+    """
+    Cost per INVOCATIONS invocations and client-side latency of every cell of `samples`.
+    Invocations are billed for their provider time, or for their client time (an upper bound) where the provider
+    time is missing, e.g. on Knative or before enrichment.
+    """
+    _require_numpy()
+    pricing = pricing or load_pricing()
+    client = samples.metrics['client_time']
+    durations = np.where(np.isnan(samples.metrics['provider_time']), client, samples.metrics['provider_time'])
+    order = np.argsort(samples.cell, kind='stable')
+    bounds = np.searchsorted(samples.cell[order], np.arange(len(samples.cells) + 1))
+
+    rows = []
+    for index, (provider, runtime, benchmark, memory, load_profile) in enumerate(samples.cells):
+        if provider not in pricing:
+            continue
+        cell_rows = order[bounds[index]:bounds[index + 1]]
+        cell_rows = cell_rows[~np.isnan(client[cell_rows]) & ~np.isnan(durations[cell_rows])]
+        if cell_rows.size == 0:
+            continue
+        billed = billed_durations(pricing[provider], durations[cell_rows])
+        costs = billed * cost_per_second(pricing[provider], memory) + pricing[provider]['per_request']
+        latencies = client[cell_rows]
+        rows.append({
+            'provider': provider, 'runtime': runtime, 'benchmark': benchmark, 'memory': memory,
+            'load_profile': load_profile, 'count': int(cell_rows.size),
+            'p50': float(np.percentile(latencies, 50)),
+            f'p{latency_percentile:g}': float(np.percentile(latencies, latency_percentile)),
+            'billed_duration': float(billed.mean()),
+            'cost_per_million': float(costs.mean()) * INVOCATIONS,
+        })
+    return rows
+
+
+def _groups(rows: List[Dict[str, Any]]) -> Dict[Tuple[str, str, str], List[Dict[str, Any]]]:
+    """Rows per (benchmark, runtime, load profile), the providers and memory sizes compared with each other."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row['benchmark'], row['runtime'], row['load_profile']), []).append(row)
+    return groups
+
+
+def mark_pareto_frontier(rows: List[Dict[str, Any]], latency: str = 'p99') -> List[Dict[str, Any]]:
+    """
+    Set `pareto` on every row: True if no other configuration of the same benchmark, runtime and load profile is
+    both cheaper and faster (at the `latency` percentile).
+    """
+    for group in _groups(rows).values():
+        best_latency = math.inf
+        for row in sorted(group, key=lambda row: (row['cost_per_million'], row[latency])):
+            row['pareto'] = row[latency] < best_latency
+            best_latency = min(best_latency, row[latency])
+    return rows
+
+
+def cheapest_meeting(rows: List[Dict[str, Any]], target: float,
+                     latency: str = 'p99') -> Dict[Tuple[str, str, str], Optional[Dict[str, Any]]]:
+    """Cheapest configuration with a `latency` of at most `target` seconds, per benchmark, runtime and profile."""
+    return {key: min((row for row in group if row[latency] <= target), key=lambda row: row['cost_per_million'],
+                     default=None)
+            for key, group in _groups(rows).items()}
+
+
+def format_costs(rows: List[Dict[str, Any]], latency: str = 'p99') -> str:
+    headers = ['Benchmark', 'Runtime', 'Profile', 'Provider', 'Memory', 'N', 'p50 (s)', f'{latency} (s)',
+               'Billed (s)', f'USD / {INVOCATIONS:,}', 'Pareto']
+    ordered = sorted(rows, key=lambda row: (row['benchmark'], row['runtime'], row['load_profile'],
+                                            row['cost_per_million']))
+    table = [[row['benchmark'], row['runtime'], row['load_profile'], row['provider'], row['memory'] or 'default',
+              row['count'], f"{row['p50']:.4f}", f"{row[latency]:.4f}", f"{row['billed_duration']:.4f}",
+              f"{row['cost_per_million']:.2f}", '*' if row.get('pareto') else '']
+             for row in ordered]
+    return tabulate(table, headers=headers, tablefmt='pretty')
+
+
+@click.command()
+@click.option('--results', default='benchmark_results', show_default=True, help='Directory of the benchmark results.')
+@click.option('--p99-target', type=float, default=None,
+              help='p99 client-side latency in seconds the chosen configuration has to meet.')
+def main(results: str, p99_target: Optional[float]):
+    samples = load_samples(results)
+    if len(samples) == 0:
+        print("No data found.")
+        return
+    rows = mark_pareto_frontier(cost_table(samples))
+    with open('benchmark_costs.json', 'w') as f:
+        json.dump(rows, f, indent=4)
+    print(format_costs(rows))
+    print("Costs saved to benchmark_costs.json")
+
+    if p99_target is not None:
+        table = [[benchmark, runtime, load_profile,
+                  *([row['provider'], row['memory'] or 'default', f"{row['p99']:.4f}", f"{row['cost_per_million']:.2f}"]
+                    if row else ['-', '-', '-', '-'])]
+                 for (benchmark, runtime, load_profile), row in sorted(cheapest_meeting(rows, p99_target).items())]
+        print(f"Cheapest configuration with a p99 of at most {p99_target}s:")
+        print(tabulate(table, headers=['Benchmark', 'Runtime', 'Profile', 'Provider', 'Memory', 'p99 (s)',
+                                       f'USD / {INVOCATIONS:,}'], tablefmt='pretty'))
+
+
+if __name__ == "__main__":
+    main()
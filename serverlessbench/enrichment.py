@@ -0,0 +1,137 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from serverlessbench.logger import LoggingBase
+from serverlessbench.results import patch_results, read_results
+
+
+class EnrichmentJob:
+    def __init__(self, provider: str, function_names: List[str], start_time: float, end_time: float,
+                 results_file: str, on_done: Optional[Callable[[], None]] = None):
+        self.provider = provider
+        self.function_names = function_names  # All functions that served the requests, e.g. cold start replicas
+        self.start_time = start_time
+        self.end_time = end_time
+        self.results_file = results_file
+        self.on_done = on_done  # Called once the results file is final
+
+
+class EnrichmentPipeline(LoggingBase):
+    """
+    Background stage that back-fills provider-side times into result files that were already written.
+    Jobs wait until the log ingestion lag estimated for the provider passed. Before the first observation
+    they don't wait at all, the provider polls with backoff until its logs are complete. Then all due jobs of a
+    provider, plus those becoming due within `batch_window`, are resolved with a single batched log query (one
+    CloudWatch Insights query over several log groups, one App Insights query over several apps, one Cloud Logging
+    filter over several services) instead of one query per function and window.
+    """
+
+    def __init__(self, providers: Dict[str, Any], batch_window: float = 10.0):
+        super().__init__()
+        # Provider backends by name, each implementing enrich_metrics_batch and owning a log_poller
+        self.providers = providers
+        # Jobs that become due within this many seconds are pulled into the current batch
+        self.batch_window = batch_window
+        self._pending: Dict[str, List[EnrichmentJob]] = {}
+        self._condition = threading.Condition()
+        self._closing = False
+        # One worker per provider, so a provider polling its logs until the deadline doesn't hold back the others
+        self._threads: Dict[str, threading.Thread] = {}
+
+    def submit(self, provider: str, function_names: List[str], start_time: float, end_time: float,
+               results_file: str, on_done: Optional[Callable[[], None]] = None):
+        if provider not in self.providers:
+            # Nothing to back-fill, the results file is already final
+            if on_done is not None:
+                on_done()
+            return
+        with self._condition:
+            self._pending.setdefault(provider, []).append(
+                EnrichmentJob(provider, function_names, start_time, end_time, results_file, on_done))
+            if provider not in self._threads:
+                self._threads[provider] = threading.Thread(target=self._run, args=(provider,),
+                                                           name=f'EnrichmentPipeline-{provider}', daemon=True)
+                self._threads[provider].start()
+            self._condition.notify_all()
+
+    def close(self):
+        """Wait until every submitted job was enriched."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+            threads = list(self._threads.values())
+        for thread in threads:
+            thread.join()
+        with self._condition:
+            self._closing = False
+
+        for provider in self.providers.values():
+            report = provider.log_poller.report()
+            if report:
+                self.logging.info(report)
+
+    def _due_time(self, job: EnrichmentJob) -> float:
+        return job.end_time + self.providers[job.provider].log_poller.expected_lag()
+
+    def _take_due_jobs(self, provider: str) -> Optional[List[EnrichmentJob]]:
+        """Block until jobs of `provider` are due and return them, or None once closed and drained."""
+        with self._condition:
+            while True:
+                pending = self._pending.get(provider, [])
+                if not pending:
+                    if self._closing:
+                        del self._threads[provider]  # A job submitted after this starts a new worker
+                        return None
+                    self._condition.wait()
+                    continue
+
+                now = time.time()
+                if any(self._due_time(job) <= now for job in pending):
+                    self._pending[provider] = [job for job in pending
+                                               if self._due_time(job) > now + self.batch_window]
+                    return [job for job in pending if self._due_time(job) <= now + self.batch_window]
+
+                self._condition.wait(timeout=min(self._due_time(job) for job in pending) - now)
+
+    def _run(self, provider: str):
+        while (jobs := self._take_due_jobs(provider)) is not None:
+            self._enrich_batch(provider, jobs)
+
+    def _enrich_batch(self, provider: str, jobs: List[EnrichmentJob]):
+        try:
+            self._enrich_result_files(provider, jobs)
+        except Exception as e:
+            # The targets stay unfinalized, so resuming the run enriches them again
+            self.logging.error(f"Failed to enrich {len(jobs)} result files of provider {provider}: {e}. Resume the "
+                               f"run to enrich and finalize them.")
+            return
+        for job in jobs:
+            if job.on_done is None:
+                continue
+            try:
+                job.on_done()
+            except Exception as e:
+                self.logging.error(f"Failed to finalize results file {job.results_file}: {e}")
+
+    def _enrich_result_files(self, provider: str, jobs: List[EnrichmentJob]):
+        function_names = set(name for job in jobs for name in job.function_names)
+        self.logging.info(
+            f"Enriching {len(jobs)} result files of {len(function_names)} {provider.upper()} functions with provider "
+            f"times.")
+
+        # Only the request ids are loaded, the records themselves stay on disk
+        windows = []
+        job_requests = []
+        for job in jobs:
+            requests = {record['request_id']: {} for record in read_results(job.results_file)
+                        if record.get('request_id')}
+            job_requests.append(requests)
+            # The requests of a job may have been served by several functions, all windows share its request dict
+            windows.extend((function_name, job.start_time, job.end_time, requests)
+                           for function_name in job.function_names)
+
+        self.providers[provider].enrich_metrics_batch(windows)
+
+        for job, requests in zip(jobs, job_requests):
+            patch_results(job.results_file, {request_id: fields for request_id, fields in requests.items() if fields})
@@ -3,14 +3,17 @@ import os
 import shutil
 import sys
 import platform
+import threading
 import time
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Tuple
 
 from tzlocal import get_localzone
 
 from serverlessbench.logger import LoggingBase
-from serverlessbench.utils import execute, compute_directory_hash, find_cache, update_cache, calculate_cpu, save_config, \
+from serverlessbench.poller import ReadinessPoller
+from serverlessbench.artifacts import needs_build, record_build
+from serverlessbench.utils import execute, calculate_cpu, save_config, \
     load_config, clean_json_output
 from google.cloud import functions_v2 as gcp_cf
 from google.cloud import run_v2
@@ -20,10 +23,14 @@ from google.cloud import logging_v2
 class GCP(LoggingBase):
     def __init__(self):
         super().__init__()
+        self.log_poller = ReadinessPoller('gcp')
         self.mvwn = 'mvnw.cmd' if platform.system() == 'Windows' else 'mvnw'
         self.key_file = 'gcloud_key.json'
+        # Clients are created once and shared by all threads, their gRPC channels stay open between calls
         self.gcp_cloud_functions_client: gcp_cf.FunctionServiceClient | None = None
         self.gcp_cloud_run_client: run_v2.ServicesClient | None = None
+        self.gcp_logging_clients: Dict[str, logging_v2.Client] = {}
+        self._session_lock = threading.Lock()
 
     def deploy(self, root_path, config, deployments, benchmark_name, benchmark, function_name, native, update):
         self._precheck(config)
@@ -36,17 +43,7 @@ class GCP(LoggingBase):
 
         region = config['providers']['gcp']['region']
 
-        src_hash = compute_directory_hash(os.path.join(submodule_path, 'src'))
-        target_hash = compute_directory_hash(os.path.join(submodule_path, 'target')) if os.path.exists(
-            os.path.join(submodule_path, 'target')) else None
-        cache = find_cache('gcp', benchmark_name, native)
-
-        if not cache or cache['src_hash'] != src_hash or cache['target_hash'] != target_hash:
-            self.build(root_path, benchmark_name, submodule_path, native)
-            target_hash = compute_directory_hash(os.path.join(submodule_path, 'target'))
-            update_cache('gcp', benchmark_name, native, src_hash, target_hash)
-        else:
-            self.logging.warning(f"Skipping build for {'gcp-native' if native else 'gcp'}. No changes detected.")
+        self.build_if_changed(root_path, config, benchmark_name, function_name, native)
 
         url = self.deploy_gcp(function_name, memory, timeout, submodule_path, region, project_id,
                               native, storage, update)
@@ -59,6 +56,14 @@ class GCP(LoggingBase):
 
         return deployments, config
 
+    def build_if_changed(self, root_path, config, benchmark_name, function_name, native):
+        submodule_path = os.path.join(root_path, "benchmarks", benchmark_name)
+        if needs_build('gcp', benchmark_name, native, submodule_path, self.logging):
+            self.build(root_path, benchmark_name, submodule_path, native)
+            record_build('gcp', benchmark_name, native, submodule_path)
+        else:
+            self.logging.warning(f"Skipping build for {'gcp-native' if native else 'gcp'}. No changes detected.")
+
     def build(self, root_path, benchmark_name, submodule_path, native):
         mvnw_path = os.path.join(root_path, self.mvwn)
         profile = 'gcp-native' if native else 'gcp'
@@ -190,63 +195,69 @@ class GCP(LoggingBase):
         pass
 
     def enrich_metrics(self, function_name: str, start_time: int, end_time: int, requests: Dict[str, dict]):
+        self.enrich_metrics_batch([(function_name, start_time, end_time, requests)])
+        return requests
+
+    def enrich_metrics_batch(self, windows: List[Tuple[str, float, float, Dict[str, dict]]]):
+        """
+        Set the provider time of every request in the given (function name, start, end, requests) windows.
+        All services are covered by a single Cloud Logging filter, repeated with backoff until every request was found.
+        """
         config = load_config()
         provider_data = config['providers']['gcp']
         self._precheck(config)
         project = provider_data.get('project')
         region = provider_data.get('region')
 
-        logging_client = logging_v2.Client(project=project)
+        logging_client = self._get_logging_client(project)
+
+        requests = {request_id: record for _, _, _, window_requests in windows
+                    for request_id, record in window_requests.items()}
+        function_names = sorted(set(function_name for function_name, _, _, _ in windows))
+        start_time = min(window_start for _, window_start, _, _ in windows)
+        end_time = max(window_end for _, _, window_end, _ in windows)
 
         # Format time strings
         start_time_str = datetime.fromtimestamp(timestamp=start_time, tz=get_localzone()).strftime(
             "%Y-%m-%dT%H:%M:%S.%f%z")
         end_time_str = datetime.fromtimestamp(timestamp=end_time, tz=get_localzone()).strftime(
             "%Y-%m-%dT%H:%M:%S.%f%z")
+        service_names = ' OR '.join(f'"{function_name}"' for function_name in function_names)
 
-        time.sleep(60.0)  # Sleep for 60 seconds to ensure logs are available
+        processed_request_ids = set()
+        request_ids_to_find_logs_for = set(requests.keys())
 
         def get_logs():
             try:
-                self.logging.info(f"Fetching logs for Cloud Run Service: {function_name} in {project}, {region}")
+                self.logging.info(
+                    f"Fetching logs for Cloud Run Services: {', '.join(function_names)} in {project}, {region}")
                 filter_query = (f'(resource.type="cloud_run_revision" OR resource.type="cloud_function") AND '
-                                f'resource.labels.service_name="{function_name}" AND resource.labels.location="{region}" AND severity>="DEFAULT" AND timestamp>="{start_time_str}" AND timestamp<="'
+                                f'resource.labels.service_name=({service_names}) AND resource.labels.location="{region}" AND severity>="DEFAULT" AND timestamp>="{start_time_str}" AND timestamp<="'
                                 f'{end_time_str}"')
                 return list(logging_client.list_entries(filter_=filter_query))
             except Exception as e:
-                self.logging.error(f"Error fetching logs for Cloud Function {function_name}: {e}")
+                self.logging.error(f"Error fetching logs for Cloud Functions {', '.join(function_names)}: {e}")
                 return None
 
-        logs = get_logs()
-        if logs is None or len(list(logs)) == 0:
-            self.logging.error(
-                f"No logs found for Cloud Function {function_name}. Maybe we gotta increase the sleep time, because the logs might need longer, or the query is wrong.")
-            return requests
-
-        processed_request_ids = set()
-        request_ids_to_find_logs_for = set(requests.keys())
-
-        for entry in logs:
-            if type(entry) is not logging_v2.LogEntry:  # The Http Request logs are of type LogEntry
-                continue
-            log_as_json = entry.to_api_repr()
-            trace: str = log_as_json.get("trace")
-
-            if trace:
-                invocation_id = trace.split("/")[-1]  # Extract the invocation ID from the trace
-                self.logging.debug(f"Found Request {invocation_id} in GCP Logs for Function {function_name}")
-                duration = float(log_as_json['httpRequest']["latency"].rstrip('s'))
-                if invocation_id in request_ids_to_find_logs_for:
-                    requests[invocation_id]["provider_time"] = duration
-                    processed_request_ids.add(invocation_id)
-
-        self.logging.info(
-            f"Found provider times for {len(processed_request_ids)} out of {len(requests.keys())} invocations."
-        )
-        if len(processed_request_ids) < len(requests.keys()):
+        def query() -> int:
+            for entry in get_logs() or []:
+                if type(entry) is not logging_v2.LogEntry:  # The Http Request logs are of type LogEntry
+                    continue
+                log_as_json = entry.to_api_repr()
+                trace: str = log_as_json.get("trace")
+
+                if trace:
+                    invocation_id = trace.split("/")[-1]  # Extract the invocation ID from the trace
+                    duration = float(log_as_json['httpRequest']["latency"].rstrip('s'))
+                    if invocation_id in request_ids_to_find_logs_for:
+                        requests[invocation_id]["provider_time"] = duration
+                        processed_request_ids.add(invocation_id)
+            return len(processed_request_ids)
+
+        result = self.log_poller.poll(query, expected=len(requests), window_end=end_time)
+        if not result.complete:
             self.logging.info(
                 f"Missing the provider times for following requests: {request_ids_to_find_logs_for - processed_request_ids}")
-        return requests
 
     def _enforce_cold_start_on_cloud_run(self, project: str, region: str, function_name: str):
         """ Updates Environment variable on Cloud Run instance (used for native code) """
@@ -501,13 +512,24 @@ class GCP(LoggingBase):
         return function_list
 
     def _precheck(self, config):
-        if shutil.which('gcloud') is None:
-            self.logging.error('gcloud CLI is not installed. Please install it before proceeding.')
-            sys.exit(1)
+        """Check the gcloud CLI and the enabled APIs and create the API clients, only on the first call."""
+        with self._session_lock:
+            if self.gcp_cloud_functions_client is not None:
+                return
+
+            if shutil.which('gcloud') is None:
+                self.logging.error('gcloud CLI is not installed. Please install it before proceeding.')
+                sys.exit(1)
+
+            self._enable_necessary_apis(config)
+            self.gcp_cloud_run_client = run_v2.ServicesClient()
+            self.gcp_cloud_functions_client = gcp_cf.FunctionServiceClient()
 
-        self.gcp_cloud_functions_client = gcp_cf.FunctionServiceClient()
-        self.gcp_cloud_run_client = run_v2.ServicesClient()
-        self._enable_necessary_apis(config)
+    def _get_logging_client(self, project: str) -> logging_v2.Client:
+        with self._session_lock:
+            if project not in self.gcp_logging_clients:
+                self.gcp_logging_clients[project] = logging_v2.Client(project=project)
+            return self.gcp_logging_clients[project]
 
     def _enable_necessary_apis(self, config):
         # Can be retrieved via gcloud services list --enabled --project=PROJECT_ID
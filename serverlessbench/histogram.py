@@ -0,0 +1,193 @@
+import json
+import math
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram in microseconds, with fixed memory and a configurable relative precision.
+    Values are counted in buckets of doubling magnitude, each split into 2 * 10^significant_digits sub-buckets, so
+    every recorded value can be reported back within 10^-significant_digits of its true value, whatever its size.
+    Histograms with the same configuration are merged by adding their counts, across worker processes and runs.
+    Recording is thread-safe.
+    """
+
+    def __init__(self, lowest: int = 1, highest: int = 3_600_000_000, significant_digits: int = 3):
+        if not 1 <= significant_digits <= 5:
+            raise ValueError('significant_digits must be between 1 and 5.')
+        if lowest < 1 or highest < 2 * lowest:
+            raise ValueError('highest must be at least twice lowest, lowest at least 1.')
+        self.lowest = lowest
+        self.highest = highest
+        self.significant_digits = significant_digits
+
+        self._unit_magnitude = int(math.floor(math.log2(lowest)))
+        self._sub_bucket_count_magnitude = int(math.ceil(math.log2(2 * 10 ** significant_digits)))
+        self._sub_bucket_half_count_magnitude = self._sub_bucket_count_magnitude - 1
+        self._sub_bucket_count = 1 << self._sub_bucket_count_magnitude
+        self._sub_bucket_half_count = self._sub_bucket_count // 2
+        self._sub_bucket_mask = (self._sub_bucket_count - 1) << self._unit_magnitude
+        bucket_count = 1
+        smallest_untrackable = self._sub_bucket_count << self._unit_magnitude
+        while smallest_untrackable <= highest:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self._counts_length = (bucket_count + 1) * self._sub_bucket_half_count
+
+        self.counts = array('Q', bytes(8 * self._counts_length))
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def empty_copy(self) -> 'LatencyHistogram':
+        return LatencyHistogram(self.lowest, self.highest, self.significant_digits)
+
+    def _index(self, value: int) -> int:
+        pow2_ceiling = (value | self._sub_bucket_mask).bit_length()
+        bucket_index = pow2_ceiling - self._unit_magnitude - (self._sub_bucket_half_count_magnitude + 1)
+        sub_bucket_index = value >> (bucket_index + self._unit_magnitude)
+        return ((bucket_index + 1) << self._sub_bucket_half_count_magnitude) + (sub_bucket_index -
+                                                                              self._sub_bucket_half_count)
+
+    def _value_at(self, index: int) -> int:
+        """Lowest value counted at `index`."""
+        bucket_index = (index >> self._sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self._sub_bucket_half_count - 1)) + self._sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self._sub_bucket_half_count
+            bucket_index = 0
+        return sub_bucket_index << (bucket_index + self._unit_magnitude)
+
+    def _highest_at(self, index: int) -> int:
+        """Highest value counted at `index`."""
+        bucket_index = max((index >> self._sub_bucket_half_count_magnitude) - 1, 0)
+        return self._value_at(index) + (1 << (bucket_index + self._unit_magnitude)) - 1
+
+    def record(self, microseconds: int, count: int = 1):
+        """Count a latency, values outside of [lowest, highest] are clamped to the range."""
+        value = min(max(int(microseconds), self.lowest), self.highest)
+        index = self._index(value)
+        with self._lock:
+            self.counts[index] += count
+            self.total += count
+            self.sum += value * count
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def record_seconds(self, seconds: Optional[float]):
+        if seconds is not None:
+            self.record(round(seconds * 1_000_000))
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        if (other.lowest, other.highest, other.significant_digits) != \
+                (self.lowest, self.highest, self.significant_digits):
+            raise ValueError('Only histograms with the same range and precision can be merged.')
+        with self._lock:
+            for index, count in enumerate(other.counts):
+                if count:
+                    self.counts[index] += count
+            self.total += other.total
+            self.sum += other.sum
+            if other.min is not None:
+                self.min = other.min if self.min is None else min(self.min, other.min)
+                self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, percentile: float) -> Optional[int]:
+        """Microseconds below which `percentile` percent of the recorded latencies lie."""
+        if self.total == 0:
+            return None
+        rank = max(1, math.ceil(percentile / 100 * self.total))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest_at(index), self.max)
+        return self.max
+
+    def percentiles(self, percentiles: Iterable[float] = PERCENTILES) -> Dict[str, Optional[int]]:
+        """Several percentiles in a single pass over the counts."""
+        percentiles = sorted(percentiles)
+        result = {f'p{percentile:g}': None for percentile in percentiles}
+        if self.total == 0:
+            return result
+        ranks = [max(1, math.ceil(percentile / 100 * self.total)) for percentile in percentiles]
+        seen = 0
+        next_percentile = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while next_percentile < len(ranks) and seen >= ranks[next_percentile]:
+                result[f'p{percentiles[next_percentile]:g}'] = min(self._highest_at(index), self.max)
+                next_percentile += 1
+            if next_percentile == len(ranks):
+                break
+        return result
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.total if self.total else None
+
+    def summary(self) -> Dict[str, Any]:
+        return {'count': self.total, 'min': self.min, 'mean': self.mean, 'max': self.max, **self.percentiles()}
+
+    def toDict(self) -> Dict[str, Any]:
+        """Configuration, totals and the non-empty buckets as [index, count] pairs."""
+        return {
+            'unit': 'us',
+            'lowest': self.lowest,
+            'highest': self.highest,
+            'significant_digits': self.significant_digits,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'sum': self.sum,
+            'counts': [[index, count] for index, count in enumerate(self.counts) if count],
+        }
+
+    @staticmethod
+    def fromDict(data: Dict[str, Any]) -> 'LatencyHistogram':
+        histogram = LatencyHistogram(data['lowest'], data['highest'], data['significant_digits'])
+        for index, count in data['counts']:
+            histogram.counts[index] = count
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        histogram.sum = data['sum']
+        return histogram
+
+
+def save_histogram(path: str, histogram: LatencyHistogram):
+    with open(path, 'w') as f:
+        json.dump(histogram.toDict(), f)
+
+
+def load_histogram(path: str) -> LatencyHistogram:
+    with open(path, 'r') as f:
+        return LatencyHistogram.fromDict(json.load(f))
+
+
+def merge_histograms(histograms: List[LatencyHistogram]) -> Optional[LatencyHistogram]:
+    """One histogram counting the latencies of all `histograms`, e.g. of the same target over several runs."""
+    if not histograms:
+        return None
+    merged = histograms[0].empty_copy()
+    for histogram in histograms:
+        merged.merge(histogram)
+    return merged
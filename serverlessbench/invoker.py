@@ -0,0 +1,405 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import urllib3
+
+from serverlessbench.histogram import LatencyHistogram
+from serverlessbench.logger import LoggingBase
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Wall-clock and monotonic clock sampled once, so client_begin/client_end are wall-clock microseconds (as needed to
+# match provider logs) while every duration is taken from the monotonic perf_counter.
+_WALL_ANCHOR_NS = time.time_ns()
+_PERF_ANCHOR_NS = time.perf_counter_ns()
+
+
+def perf_to_wall_us(perf_ns: int) -> int:
+    """Convert a time.perf_counter_ns() timestamp to wall-clock microseconds since the epoch."""
+    return (_WALL_ANCHOR_NS + perf_ns - _PERF_ANCHOR_NS) // 1_000
+
+
+def get_request_id(headers, provider: str) -> Optional[str]:
+    if provider == 'aws':
+        return headers.get('x-amzn-RequestId')
+    elif provider == 'azure':
+        return headers.get('X-Azure-Functions-InvocationId')
+    elif provider == 'gcp':
+        trace = headers.get('X-Cloud-Trace-Context')
+        return trace.split(';')[0] if trace else None
+    elif provider == 'knative':
+        return headers.get('x-client-trace-id')
+
+
+class FunctionInvocationResult:
+    def __init__(self, request_id: str, client_begin: int, client_end: int, client_time: float,
+                 response_body: dict | str | None, status_code: Optional[int] = None, error: Optional[str] = None):
+        self.request_id = request_id
+        self.provider_time = None  # Will be set later
+        self.client_begin = client_begin
+        self.client_end = client_end
+        self.client_time = client_time
+        self.response_body = response_body
+        self.status_code = status_code  # None if no response was received
+        self.error = error  # Why the request failed (error status or transport error), None on success
+
+    def toJSON(self):
+        return json.dumps(
+            self,
+            default=lambda o: o.__dict__,
+            sort_keys=True,
+            indent=4)
+
+    def toDict(self) -> dict:
+        return dict(self.__dict__)
+
+
+ResultCallback = Callable[[FunctionInvocationResult], None]
+BurstResultCallback = Callable[[int, FunctionInvocationResult], None]
+
+
+class Invoker(LoggingBase):
+    """
+    Engine that sends benchmark requests. The COLD, WARM and BURST profiles only talk to this interface, so they
+    work with both the blocking urllib3 engine and the asyncio engine.
+    Failed requests (error status or no response at all) don't stop a run, both engines return them as results with
+    their status code and error, so they are recorded next to the successful ones.
+    """
+
+    def invoke(self, provider: str, url: str, method: str,
+               request_body: Optional[dict]) -> FunctionInvocationResult:
+        """Send a single request and wait for its response."""
+        raise NotImplementedError()
+
+    def run_closed_loop(self, provider: str, url: str, method: str, request_body: Optional[dict], repetitions: int,
+                        warmup: int, concurrency: int, duration: Optional[float],
+                        on_result: Optional[ResultCallback] = None,
+                        histogram: Optional[LatencyHistogram] = None) -> List[FunctionInvocationResult]:
+        """
+        Send `warmup` requests and throw their results away, then keep `concurrency` requests in flight until
+        `repetitions` requests were sent or `duration` seconds elapsed.
+        Results are handed to `on_result` as they arrive, only without a callback they are collected and returned.
+        The client time of every successful (non warm-up) result is counted in `histogram`.
+        """
+        raise NotImplementedError()
+
+    def run_schedule(self, provider: str, url: str, method: str, request_body: Optional[dict],
+                     schedule: List[Tuple[float, int, int]],
+                     on_result: Optional[BurstResultCallback] = None,
+                     histogram: Optional[LatencyHistogram] = None) -> List[Tuple[int, FunctionInvocationResult]]:
+        """
+        Dispatch every (offset, burst, size) schedule entry at its offset, regardless of requests still in flight.
+        Requests of the same entry leave at the same instant.
+        (burst, result) pairs are handed to `on_result` as they arrive, only without a callback they are collected
+        and returned. The client time of every successful result is counted in `histogram`.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _prepare_request(provider: str, request_body: Optional[dict]) -> Tuple[Dict[str, str], Optional[str]]:
+        headers = {'Content-Type': 'application/json'}
+        if provider == "knative":
+            # Knative requires to set a request id manually, for the other providers the request id is extracted
+            # from the response headers
+            headers['x-client-trace-id'] = str(uuid.uuid4())
+        body_data = json.dumps(request_body) if request_body else None
+        return headers, body_data
+
+    @staticmethod
+    def _build_result(provider: str, request_headers: Dict[str, str], headers, status_code: int, response_body: str,
+                      start_ns: int, end_ns: int) -> FunctionInvocationResult:
+        try:
+            response_dict = json.loads(response_body) if response_body else {}
+        except json.JSONDecodeError:
+            response_dict = response_body
+        # Knative responses may lack the trace id header (e.g. errors of the ingress), it was set by the client
+        request_id = get_request_id(headers=headers, provider=provider) or request_headers.get('x-client-trace-id')
+        return FunctionInvocationResult(request_id=request_id,
+                                        client_begin=perf_to_wall_us(start_ns),
+                                        client_end=perf_to_wall_us(end_ns),
+                                        client_time=(end_ns - start_ns) / 1_000_000_000,
+                                        response_body=response_dict,
+                                        status_code=status_code,
+                                        error=f'HTTP {status_code}' if status_code >= 400 else None)
+
+    @staticmethod
+    def _failed_result(request_headers: Dict[str, str], error: Exception, start_ns: int,
+                       end_ns: int) -> FunctionInvocationResult:
+        """Result of a request that got no response, e.g. a connection error or a timeout."""
+        return FunctionInvocationResult(request_id=request_headers.get('x-client-trace-id'),
+                                        client_begin=perf_to_wall_us(start_ns),
+                                        client_end=perf_to_wall_us(end_ns),
+                                        client_time=(end_ns - start_ns) / 1_000_000_000,
+                                        response_body=None,
+                                        error=f'{type(error).__name__}: {error}')
+
+    def _check_result(self, url: str, result: FunctionInvocationResult):
+        if result.error is not None:
+            self.logging.error(f"Request to {url} failed: {result.error}")
+        elif isinstance(result.response_body, str):
+            self.logging.error(f"Error decoding JSON response for {url}: {result.response_body[:200]}")
+
+    @staticmethod
+    def _count(histogram: Optional[LatencyHistogram], result: FunctionInvocationResult):
+        """Count a result in `histogram`, failed requests would distort the latency distribution."""
+        if histogram is not None and result.error is None:
+            histogram.record_seconds(result.client_time)
+
+
+class SyncInvoker(Invoker):
+    """Blocking urllib3 engine, concurrency comes from one thread per in-flight request."""
+
+    def __init__(self, max_connections: int = 1):
+        super().__init__()
+        # 2 minute timeout, one pooled connection per concurrent caller so WARM/BURST workers don't open new ones
+        self.http = urllib3.PoolManager(timeout=urllib3.Timeout(total=120.0), maxsize=max(1, max_connections))
+
+    def invoke(self, provider: str, url: str, method: str,
+               request_body: Optional[dict]) -> FunctionInvocationResult:
+        """Execute a benchmark request and measure its response time using urllib3."""
+        headers, body_data = self._prepare_request(provider, request_body)
+
+        start_ns = time.perf_counter_ns()
+        try:
+            response = self.http.request(
+                method.upper(),
+                url,
+                body=body_data,
+                headers=headers,
+            )
+            end_ns = time.perf_counter_ns()
+            result = self._build_result(provider, headers, response.headers, response.status,
+                                        response.data.decode('utf-8', errors='replace'), start_ns, end_ns)
+        except Exception as e:
+            result = self._failed_result(headers, e, start_ns, time.perf_counter_ns())
+        self._check_result(url, result)
+        return result
+
+    def run_closed_loop(self, provider: str, url: str, method: str, request_body: Optional[dict], repetitions: int,
+                        warmup: int, concurrency: int, duration: Optional[float],
+                        on_result: Optional[ResultCallback] = None,
+                        histogram: Optional[LatencyHistogram] = None) -> List[FunctionInvocationResult]:
+        results = []
+        results_lock = threading.Lock()
+        issued = 0
+        deadline = None
+
+        def next_request_allowed() -> bool:
+            nonlocal issued
+            if deadline is not None:
+                return time.monotonic() < deadline
+            with results_lock:
+                if issued >= repetitions:
+                    return False
+                issued += 1
+                return True
+
+        def worker():
+            while next_request_allowed():
+                result = self.invoke(provider=provider, url=url, method=method, request_body=request_body)
+                self._count(histogram, result)
+                if on_result is not None:
+                    on_result(result)
+                    continue
+                with results_lock:
+                    results.append(result)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            if warmup:
+                list(executor.map(lambda _: self.invoke(provider=provider, url=url, method=method,
+                                                        request_body=request_body), range(warmup)))
+
+            deadline = time.monotonic() + duration if duration else None
+            workers = [executor.submit(worker) for _ in range(concurrency)]
+            for future in workers:
+                future.result()
+        return results
+
+    def run_schedule(self, provider: str, url: str, method: str, request_body: Optional[dict],
+                     schedule: List[Tuple[float, int, int]],
+                     on_result: Optional[BurstResultCallback] = None,
+                     histogram: Optional[LatencyHistogram] = None) -> List[Tuple[int, FunctionInvocationResult]]:
+        results = []
+        results_lock = threading.Lock()
+        threads = []
+
+        def fire(barrier: Optional[threading.Barrier], burst: int):
+            if barrier is not None:
+                barrier.wait()
+            result = self.invoke(provider=provider, url=url, method=method, request_body=request_body)
+            self._count(histogram, result)
+            if on_result is not None:
+                on_result(burst, result)
+                return
+            with results_lock:
+                results.append((burst, result))
+
+        start = time.monotonic()
+        for offset, burst, size in schedule:
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            barrier = threading.Barrier(size) if size > 1 else None
+            for _ in range(size):
+                thread = threading.Thread(target=fire, args=(barrier, burst))
+                thread.start()
+                threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+        return results
+
+    def close(self):
+        self.http.clear()
+
+
+class AsyncInvoker(Invoker):
+    """
+    Non-blocking aiohttp engine. All requests run on one event loop in a background thread, so a single client
+    process can keep thousands of requests in flight without a thread per request. The public methods are blocking
+    and thread-safe.
+    """
+
+    def __init__(self, max_connections: int = 0):
+        super().__init__()
+        if aiohttp is None:
+            self.logging.error('aiohttp is not installed. Please install it to use the async invocation engine.')
+            exit(-1)
+        # 0 means no limit. A limit holds the requests above it in aiohttp's queue, and that wait would be measured
+        # as latency, so the benchmarks leave it at 0 like the non-blocking pool of the sync engine
+        self.max_connections = max_connections
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='AsyncInvoker', daemon=True)
+        self._thread.start()
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=0),
+                timeout=aiohttp.ClientTimeout(total=120.0))  # 2 minute timeout
+        return self._session
+
+    async def _invoke(self, provider: str, url: str, method: str,
+                      request_body: Optional[dict]) -> FunctionInvocationResult:
+        headers, body_data = self._prepare_request(provider, request_body)
+        session = await self._get_session()
+
+        start_ns = time.perf_counter_ns()
+        try:
+            async with session.request(method.upper(), url, data=body_data, headers=headers) as response:
+                response_body = await response.text(errors='replace')
+                end_ns = time.perf_counter_ns()
+                result = self._build_result(provider, headers, response.headers, response.status, response_body,
+                                            start_ns, end_ns)
+        except Exception as e:  # aiohttp.ClientError, asyncio.TimeoutError, ...
+            result = self._failed_result(headers, e, start_ns, time.perf_counter_ns())
+        self._check_result(url, result)
+        return result
+
+    def invoke(self, provider: str, url: str, method: str,
+               request_body: Optional[dict]) -> FunctionInvocationResult:
+        return self._submit(self._invoke(provider, url, method, request_body))
+
+    async def _closed_loop(self, provider: str, url: str, method: str, request_body: Optional[dict],
+                           repetitions: int, warmup: int, concurrency: int, duration: Optional[float],
+                           on_result: Optional[ResultCallback],
+                           histogram: Optional[LatencyHistogram]) -> List[FunctionInvocationResult]:
+        results = []
+        issued = 0
+
+        async def worker(deadline: Optional[float], limit: int, collect: bool):
+            nonlocal issued
+            while (time.monotonic() < deadline) if deadline is not None else issued < limit:
+                issued += 1
+                result = await self._invoke(provider, url, method, request_body)
+                if not collect:
+                    continue
+                self._count(histogram, result)
+                if on_result is not None:
+                    on_result(result)
+                else:
+                    results.append(result)
+
+        if warmup:
+            await asyncio.gather(*[worker(None, warmup, False) for _ in range(min(concurrency, warmup))])
+            issued = 0
+
+        deadline = time.monotonic() + duration if duration else None
+        await asyncio.gather(*[worker(deadline, repetitions, True) for _ in range(concurrency)])
+        return results
+
+    def run_closed_loop(self, provider: str, url: str, method: str, request_body: Optional[dict], repetitions: int,
+                        warmup: int, concurrency: int, duration: Optional[float],
+                        on_result: Optional[ResultCallback] = None,
+                        histogram: Optional[LatencyHistogram] = None) -> List[FunctionInvocationResult]:
+        return self._submit(self._closed_loop(provider, url, method, request_body, repetitions, warmup, concurrency,
+                                              duration, on_result, histogram))
+
+    async def _schedule(self, provider: str, url: str, method: str, request_body: Optional[dict],
+                        schedule: List[Tuple[float, int, int]],
+                        on_result: Optional[BurstResultCallback],
+                        histogram: Optional[LatencyHistogram]) -> List[Tuple[int, FunctionInvocationResult]]:
+        results = []
+
+        async def fire(release: asyncio.Event, burst: int):
+            await release.wait()
+            result = await self._invoke(provider, url, method, request_body)
+            self._count(histogram, result)
+            if on_result is not None:
+                on_result(burst, result)
+            else:
+                results.append((burst, result))
+
+        tasks = []
+        start = time.monotonic()
+        for offset, burst, size in schedule:
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Create all requests of a burst first and release them together
+            release = asyncio.Event()
+            tasks.extend(asyncio.create_task(fire(release, burst)) for _ in range(size))
+            await asyncio.sleep(0)
+            release.set()
+            # Drop finished tasks (raising their errors), so long open-loop runs don't accumulate them
+            for task in tasks:
+                if task.done():
+                    task.result()
+            tasks = [task for task in tasks if not task.done()]
+        await asyncio.gather(*tasks)
+        return results
+
+    def run_schedule(self, provider: str, url: str, method: str, request_body: Optional[dict],
+                     schedule: List[Tuple[float, int, int]],
+                     on_result: Optional[BurstResultCallback] = None,
+                     histogram: Optional[LatencyHistogram] = None) -> List[Tuple[int, FunctionInvocationResult]]:
+        return self._submit(self._schedule(provider, url, method, request_body, schedule, on_result, histogram))
+
+    def close(self):
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def create_invoker(engine: str, max_connections: int = 1) -> Invoker:
+    if engine == 'async':
+        # No connection limit, requests of open-loop schedules and parallel targets must not queue in the client
+        return AsyncInvoker()
+    return SyncInvoker(max_connections=max_connections)
@@ -4,7 +4,8 @@ import os
 import yaml
 import platform
 from serverlessbench.logger import LoggingBase
-from serverlessbench.utils import execute, compute_directory_hash, find_cache, update_cache, calculate_cpu
+from serverlessbench.artifacts import needs_build, record_build
+from serverlessbench.utils import execute, find_cache, update_cache, calculate_cpu
 
 
 class Knative(LoggingBase):
@@ -37,30 +38,7 @@ class Knative(LoggingBase):
             else:
                 self.env = {"AWS_ACCESS_KEY_ID": s3_access_key_id, "AWS_SECRET_ACCESS_KEY": s3_secret_access_key}
 
-        src_hash = compute_directory_hash(os.path.join(submodule_path, 'src'))
-        target_hash = compute_directory_hash(os.path.join(submodule_path, 'target')) if os.path.exists(
-            os.path.join(submodule_path, 'target')) else None
-        cache = find_cache('knative', benchmark_name, native)
-
-        if not cache or cache['src_hash'] != src_hash or cache['target_hash'] != target_hash:
-            self.build(root_path, benchmark_name, submodule_path, native)
-            target_hash = compute_directory_hash(os.path.join(submodule_path, 'target'))
-            update_cache('knative', benchmark_name, native, src_hash, target_hash)
-            self.build_image(submodule_path, native, image_name)
-            update_cache('knative', benchmark_name, native, src_hash, target_hash, self.get_image_hash(image_name))
-            self.push_image(image_name)
-        else:
-            self.logging.warning(
-                f'Skipping build for "{benchmark_name}" with profile {"knative-native" if native else "knative"}. No changes detected.')
-
-            image_hash = self.get_image_hash(image_name)
-            if image_hash is None or cache.get("image_hash") is None or cache.get("image_hash") != image_hash:
-                self.build_image(submodule_path, native, image_name)
-                update_cache('knative', benchmark_name, native, src_hash, target_hash, self.get_image_hash(image_name))
-                self.push_image(image_name)
-            else:
-                self.logging.warning(
-                    f'Skipping image build for "{benchmark_name}" with profile {"knative-native" if native else "knative"}. No changes detected.')
+        self.build_if_changed(root_path, config, benchmark_name, function_name, native)
 
         if update:
             self.update_knative_function(function_name, submodule_path)
@@ -79,6 +57,34 @@ class Knative(LoggingBase):
 
         return deployments, config
 
+    def build_if_changed(self, root_path, config, benchmark_name, function_name, native):
+        """Build the benchmark and its container image unless neither the sources nor the image changed."""
+        submodule_path = os.path.join(root_path, "benchmarks", benchmark_name)
+        image_registry = config['providers']['knative']['image-registry']
+        image_group = config['providers']['knative']['image-group']
+        image_name = f'{image_registry}/{image_group}/{function_name[:-9]}:{"native" if native else "jvm"}'
+
+        if needs_build('knative', benchmark_name, native, submodule_path, self.logging):
+            self.build(root_path, benchmark_name, submodule_path, native)
+            src_hash, target_hash = record_build('knative', benchmark_name, native, submodule_path)
+            self.build_image(submodule_path, native, image_name)
+            update_cache('knative', benchmark_name, native, src_hash, target_hash, self.get_image_hash(image_name))
+            self.push_image(image_name)
+        else:
+            self.logging.warning(
+                f'Skipping build for "{benchmark_name}" with profile {"knative-native" if native else "knative"}. No changes detected.')
+
+            cache = find_cache('knative', benchmark_name, native)
+            src_hash, target_hash = cache['src_hash'], cache['target_hash']
+            image_hash = self.get_image_hash(image_name)
+            if image_hash is None or cache.get("image_hash") is None or cache.get("image_hash") != image_hash:
+                self.build_image(submodule_path, native, image_name)
+                update_cache('knative', benchmark_name, native, src_hash, target_hash, self.get_image_hash(image_name))
+                self.push_image(image_name)
+            else:
+                self.logging.warning(
+                    f'Skipping image build for "{benchmark_name}" with profile {"knative-native" if native else "knative"}. No changes detected.')
+
     def build(self, root_path, benchmark_name, submodule_path, native):
         mvnw_path = os.path.join(root_path, self.mvwn)
         profile = 'knative-native' if native else 'knative'
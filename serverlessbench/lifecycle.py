@@ -0,0 +1,151 @@
+import statistics
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from serverlessbench.logger import LoggingBase
+
+
+class InstanceLifecycle:
+    """Everything observed about one container instance, identified by the `container_id` of its responses."""
+
+    def __init__(self, container_id: str):
+        self.container_id = container_id
+        self.intervals: List[Tuple[int, int]] = []  # (begin, end) of every request in microseconds
+        self.cold_starts = 0
+        self.cold_start_vars = set()
+
+    def add(self, begin: int, end: int, is_cold: bool, cold_start_var: Optional[str]):
+        self.intervals.append((begin, end))
+        if is_cold:
+            self.cold_starts += 1
+        if cold_start_var is not None:
+            self.cold_start_vars.add(cold_start_var)
+
+    @property
+    def first_seen(self) -> int:
+        return min(begin for begin, _ in self.intervals)
+
+    @property
+    def last_seen(self) -> int:
+        return max(end for _, end in self.intervals)
+
+    @property
+    def lifetime(self) -> float:
+        """Seconds between the start of the first and the end of the last request the instance served."""
+        return (self.last_seen - self.first_seen) / 1_000_000
+
+    def concurrency(self) -> Tuple[int, float]:
+        """Peak and time-weighted mean number of requests the instance served at the same time while busy."""
+        events = sorted([(begin, 1) for begin, _ in self.intervals] + [(end, -1) for _, end in self.intervals])
+        in_flight = peak = 0
+        busy_time = weighted = 0
+        previous = None
+        for timestamp, change in events:
+            if previous is not None and in_flight > 0:
+                busy_time += timestamp - previous
+                weighted += (timestamp - previous) * in_flight
+            in_flight += change
+            peak = max(peak, in_flight)
+            previous = timestamp
+        return peak, (weighted / busy_time if busy_time else float(peak))
+
+    def toDict(self) -> Dict[str, Any]:
+        peak, mean = self.concurrency()
+        return {
+            'container_id': self.container_id,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'lifetime': self.lifetime,
+            'requests': len(self.intervals),
+            'cold_starts': self.cold_starts,
+            'cold_start_vars': sorted(self.cold_start_vars),
+            'peak_concurrency': peak,
+            'mean_concurrency': mean,
+        }
+
+
+class LifecycleTracker(LoggingBase):
+    """
+    Groups invocation records by the container that served them and derives instance lifetimes, requests served per
+    instance, the instance reuse rate and the concurrency per instance over time.
+    Timestamps are the begin/end the benchmark wrapper measured inside the container, the client timestamps are
+    used for responses without them.
+    """
+
+    def __init__(self, bucket_seconds: float = 1.0):
+        super().__init__()
+        self.bucket_seconds = bucket_seconds  # Resolution of the concurrency timeline
+        self.instances: Dict[str, InstanceLifecycle] = {}
+        self.requests = 0
+        self.unattributed = 0  # Records without a container id, e.g. failed invocations
+
+    def add(self, record: Dict[str, Any]):
+        response_body = record.get('response_body')
+        if not isinstance(response_body, dict):
+            response_body = {}  # Non-JSON responses, e.g. error pages
+        container_id = response_body.get('container_id')
+        begin = response_body.get('begin') or record.get('client_begin')
+        end = response_body.get('end') or record.get('client_end')
+        if container_id is None or begin is None or end is None:
+            self.unattributed += 1
+            return
+        self.requests += 1
+        instance = self.instances.get(container_id)
+        if instance is None:
+            instance = self.instances[container_id] = InstanceLifecycle(container_id)
+        instance.add(int(begin), int(end), bool(response_body.get('is_cold')), response_body.get('cold_start_var'))
+
+    def add_all(self, records: Iterable[Dict[str, Any]]) -> 'LifecycleTracker':
+        for record in records:
+            self.add(record)
+        return self
+
+    @property
+    def reuse_rate(self) -> float:
+        """Share of the requests served by an instance that had already served an earlier request."""
+        return (self.requests - len(self.instances)) / self.requests if self.requests else 0.0
+
+    def timeline(self) -> List[Dict[str, Any]]:
+        """Active instances and mean requests in flight per active instance, per `bucket_seconds` bucket."""
+        if not self.instances:
+            return []
+        bucket = int(self.bucket_seconds * 1_000_000)
+        start = min(instance.first_seen for instance in self.instances.values())
+        busy: Dict[int, int] = {}  # bucket -> microseconds of request execution
+        active: Dict[int, set] = {}  # bucket -> containers serving a request in it
+        for instance in self.instances.values():
+            for begin, end in instance.intervals:
+                for index in range((begin - start) // bucket, (max(end - 1, begin) - start) // bucket + 1):
+                    bucket_begin = start + index * bucket
+                    overlap = min(end, bucket_begin + bucket) - max(begin, bucket_begin)
+                    busy[index] = busy.get(index, 0) + max(overlap, 0)
+                    active.setdefault(index, set()).add(instance.container_id)
+
+        return [{
+            'time': index * self.bucket_seconds,
+            'active_instances': len(active[index]),
+            'concurrency_per_instance': busy[index] / bucket / len(active[index]),
+        } for index in sorted(active)]
+
+    def summary(self) -> Dict[str, Any]:
+        instances = [instance.toDict() for instance in self.instances.values()]
+        lifetimes = [instance['lifetime'] for instance in instances]
+        requests = [instance['requests'] for instance in instances]
+        return {
+            'requests': self.requests,
+            'unattributed_requests': self.unattributed,
+            'instances': len(instances),
+            'reuse_rate': self.reuse_rate,
+            'lifetime': {
+                'min': min(lifetimes, default=None),
+                'median': statistics.median(lifetimes) if lifetimes else None,
+                'max': max(lifetimes, default=None),
+            },
+            'requests_per_instance': {
+                'mean': statistics.mean(requests) if requests else None,
+                'max': max(requests, default=None),
+            },
+            'peak_concurrency_per_instance': max((instance['peak_concurrency'] for instance in instances),
+                                                 default=None),
+            'per_instance': sorted(instances, key=lambda instance: instance['first_seen']),
+            'timeline': self.timeline(),
+        }
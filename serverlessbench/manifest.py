@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from serverlessbench.logger import LoggingBase
+
+RUNS_DIR = 'runs'
+
+# (provider, runtime, benchmark, memory) of one memory size of a benchmark target
+TargetKey = Tuple[str, str, str, Optional[int]]
+
+
+def get_manifest_path(root_path: str, run_id: str) -> str:
+    return os.path.join(root_path, 'benchmark_results', RUNS_DIR, f'{run_id}.jsonl')
+
+
+class RunManifest(LoggingBase):
+    """
+    Append-only progress log of a benchmark run, one JSON event per line, fsynced after every event.
+    The first event stores the run parameters. Every target then records when it started, every completed cold
+    repetition, when all its invocations were sent (with the time window needed to enrich them) and when its results
+    were finalized. Replaying the events tells a resumed run what it can skip.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.parameters: Optional[Dict[str, Any]] = None
+        self._started: Dict[TargetKey, float] = {}
+        self._repetitions: Dict[TargetKey, int] = {}
+        self._invoked: Dict[TargetKey, Tuple[float, float]] = {}
+        self._finalized = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._replay()
+
+    @staticmethod
+    def _key(event: Dict[str, Any]) -> TargetKey:
+        return event['provider'], event['runtime'], event['benchmark'], event['memory']
+
+    def _replay(self):
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn last line of an interrupted run
+                self._apply(event)
+
+    def _apply(self, event: Dict[str, Any]):
+        kind = event['event']
+        if kind == 'run':
+            self.parameters = event['parameters']
+            return
+        key = self._key(event)
+        if kind == 'started':
+            self._started.setdefault(key, event['time'])
+        elif kind == 'repetition':
+            self._repetitions[key] = max(self._repetitions.get(key, 0), event['repetition'])
+        elif kind == 'invoked':
+            self._invoked[key] = (event['start_time'], event['end_time'])
+        elif kind == 'finalized':
+            self._finalized.add(key)
+
+    def _append(self, event: Dict[str, Any]):
+        with self._lock:
+            self._apply(event)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(event) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _target_event(self, event: str, target: TargetKey, **fields) -> Dict[str, Any]:
+        provider, runtime, benchmark, memory = target
+        return dict(event=event, provider=provider, runtime=runtime, benchmark=benchmark, memory=memory, **fields)
+
+    def record_run(self, parameters: Dict[str, Any]):
+        self._append({'event': 'run', 'parameters': parameters})
+
+    def record_started(self, target: TargetKey, started: float):
+        self._append(self._target_event('started', target, time=started))
+
+    def record_repetition(self, target: TargetKey, repetition: int):
+        self._append(self._target_event('repetition', target, repetition=repetition))
+
+    def record_invoked(self, target: TargetKey, start_time: float, end_time: float):
+        self._append(self._target_event('invoked', target, start_time=start_time, end_time=end_time))
+
+    def record_finalized(self, target: TargetKey):
+        self._append(self._target_event('finalized', target))
+
+    def started(self, target: TargetKey) -> Optional[float]:
+        return self._started.get(target)
+
+    def completed_repetitions(self, target: TargetKey) -> int:
+        return self._repetitions.get(target, 0)
+
+    def invoked_window(self, target: TargetKey) -> Optional[Tuple[float, float]]:
+        return self._invoked.get(target)
+
+    def is_finalized(self, target: TargetKey) -> bool:
+        return target in self._finalized
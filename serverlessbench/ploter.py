@@ -1,97 +1,254 @@
 import os
+import sys
 import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+if not __package__:
+    # Run as a script (python serverlessbench/ploter.py), make the serverlessbench package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use('Agg')  # Figures are rendered in worker processes, without a display
 import matplotlib.pyplot as plt
+import numpy as np
 import seaborn as sns
 import pandas as pd
 from matplotlib.ticker import LogFormatter
 
-def read_json_files(base_path):
-    data = []
-    for root, dirs, files in os.walk(base_path):
-        for file in files:
-            if file.endswith(".json"):
-                memory = file.split('_')[-1].replace('.json', '') 
-                path_parts = root.split(os.sep)
-                provider = path_parts[-3]
-                execution_type = path_parts[-2]  
-                function_name = path_parts[-1]
-                try:
-                    with open(os.path.join(root, file), 'r') as f:
-                        json_data = json.load(f)
-                        for key in json_data:
-                            entry = {
-                                "Function": function_name,
-                                "Provider": provider,
-                                "Memory": memory,
-                                "ExecutionType": execution_type,
-                                "client_time": json_data[key].get("client_time"),
-                                "provider_time": json_data[key].get("provider_time"),
-                                "results_time": json_data[key]["response_body"].get("results_time")
-                            }
-                            data.append(entry)
-                except (KeyError, json.JSONDecodeError) as e:
-                    print(f"Error {e} in file {file} for key {key}")
-    return data
-
-def create_boxplots(data, output_dir):
-    df = pd.DataFrame(data)
-    print("DataFrame columns:", df.columns)
-    print("DataFrame head:", df.head())
-
-    if 'Function' not in df.columns:
-        print("Error: 'Function' column not found in DataFrame")
-        return
-    
-    df_melted = pd.melt(df, id_vars=["Function", "Provider", "Memory", "ExecutionType"],
-                        value_vars=["client_time", "provider_time", "results_time"],
-                        var_name="TimeType", value_name="Time")
-
-    for func in df['Function'].unique():
-        for execution_type in ['jvm', 'native']:
-            df_exec = df_melted[(df_melted['Function'] == func) & (df_melted['ExecutionType'] == execution_type)]
-            if df_exec.empty:
-                continue
-            
-            plt.figure(figsize=(16, 10))
-            
-            flierprops = dict(marker='D', markerfacecolor='grey', markeredgecolor='grey', markersize=5, linestyle='none')
-
-            ax = sns.boxplot(x='Memory', y='Time', hue='TimeType', data=df_exec,
-                             palette='pastel', flierprops=flierprops)
-
-            plt.yscale('log')  
-            ax.yaxis.set_major_formatter(LogFormatter(base=10.0))  
-
-            providers = df_exec['Provider'].unique()
-            memories = sorted(df_exec['Memory'].unique())
-            ax.set_xticks(range(len(memories) * len(providers)))
-            ax.set_xticklabels([f"{mem} ({prov})" for prov in providers for mem in memories])
-
-            for idx in range(0, len(memories) * len(providers), len(memories)):
-                plt.axvline(idx - 0.5, color='grey', linestyle='--')
-
-            plt.title(f'{func} - {execution_type.upper()} Execution Times by Memory and Provider')
-            plt.xlabel('Memory (MB) - Provider')
-            plt.ylabel('Time (s)')
-            plt.legend(title='Time Type', loc='upper right')
-            plt.xticks(rotation=45)
-            plt.grid(True)
-            
-            plot_file = os.path.join(output_dir, f'{func}_{execution_type}_boxplots.png')
-            plt.savefig(plot_file, bbox_inches='tight')
-            plt.close()
-            print(f"Plot saved to {plot_file}")
+from serverlessbench.analysis import METRICS, find_result_files
+from serverlessbench.store import STORE_DIR, ds, load_catalog, load_results, pa
+
+# Input fingerprints of the figures of the last render, kept next to the figures
+RENDER_STATE_FILE = '.render_state.json'
+# Part of every fingerprint, bump it when the figures change so all of them are rendered again
+RENDER_VERSION = 1
+
+TIME_TYPE = pd.CategoricalDtype(METRICS, ordered=True)
+
+
+def read_records(path):
+    """Yield the invocation records of a results file, either JSONL (one record per line) or a legacy JSON dict."""
+    with open(path, 'r') as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f).values()
+
+
+def memory_label(memory):
+    return "default" if memory is None or pd.isna(memory) else str(int(memory))
+
+
+def _memory_order(labels):
+    """Memory labels in numeric order, "default" (no configurable memory) last."""
+    return sorted(labels, key=lambda label: (label == "default", int(label) if label != "default" else 0))
+
+
+def find_figures(base_path):
+    """
+    Inputs of every figure, one per (function, runtime): from the columnar store if it holds any runs, otherwise
+    the results files. Returns {(function, runtime): {'source': 'store' | 'files', 'files': [...]}}, where the
+    files of the 'files' source are (provider, memory, path) tuples.
+    """
+    figures = {}
+    if pa is not None and load_catalog(base_path):
+        for entry in load_catalog(base_path):
+            figure = figures.setdefault((entry['benchmark'], entry['runtime']), {'source': 'store', 'files': []})
+            figure['files'].append(os.path.join(base_path, STORE_DIR, entry['path']))
+    else:
+        for (provider, runtime, benchmark, memory, _), path in find_result_files(base_path, ('.json', '.jsonl')):
+            figure = figures.setdefault((benchmark, runtime), {'source': 'files', 'files': []})
+            figure['files'].append((provider, memory_label(memory), path))
+    return figures
+
+
+def fingerprint(figure):
+    """Size and modification time of every input file, a figure is rendered again when any of them changes."""
+    files = []
+    for file in figure['files']:
+        path = file if figure['source'] == 'store' else file[2]
+        try:
+            stat = os.stat(path)
+            files.append([path, stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            files.append([path, None, None])
+    return {'version': RENDER_VERSION, 'source': figure['source'], 'files': sorted(files)}
+
+
+def load_render_state(output_dir):
+    path = os.path.join(output_dir, RENDER_STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {}
+
+
+def save_render_state(output_dir, state):
+    path = os.path.join(output_dir, RENDER_STATE_FILE)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(temp_path, path)
+
+
+def _long_frame(provider, memory, times):
+    """
+    Long-format frame of one input: a Provider, Memory, TimeType and Time row per invocation and metric.
+    Provider and Memory are categorical with the categories of the input only, they are unified by the caller.
+    """
+    count = len(times[METRICS[0]])
+    return pd.DataFrame({
+        'Provider': pd.Categorical(np.full(count * len(METRICS), provider)),
+        'Memory': pd.Categorical(np.full(count * len(METRICS), memory)),
+        'TimeType': pd.Categorical(np.repeat(np.asarray(METRICS), count), dtype=TIME_TYPE),
+        'Time': np.concatenate([times[metric] for metric in METRICS]),
+    })
+
+
+def _finish_frame(frames):
+    """Concatenate the per-input frames with common categories and drop missing times (e.g. not enriched)."""
+    if not frames:
+        return pd.DataFrame({'Provider': pd.Categorical([]), 'Memory': pd.Categorical([]),
+                             'TimeType': pd.Categorical([], dtype=TIME_TYPE), 'Time': np.zeros(0)})
+    providers = sorted(set().union(*(frame['Provider'].cat.categories for frame in frames)))
+    memories = _memory_order(set().union(*(frame['Memory'].cat.categories for frame in frames)))
+    df = pd.concat([frame.astype({'Provider': pd.CategoricalDtype(providers, ordered=True),
+                                  'Memory': pd.CategoricalDtype(memories, ordered=True)}) for frame in frames],
+                   ignore_index=True)
+    return df[df['Time'].notna()]
+
+
+def read_files_frame(files):
+    """Read results files one at a time, each record straight into float64 arrays, no per-record dicts are kept."""
+    frames = []
+    for provider, memory, path in files:
+        times = {metric: [] for metric in METRICS}
+        try:
+            for record in read_records(path):
+                if record.get("error") is not None:
+                    continue  # Failed invocations
+                response_body = record.get("response_body")
+                if not isinstance(response_body, dict):
+                    response_body = {}  # Non-JSON responses, e.g. error pages
+                for metric in METRICS:
+                    value = record.get(metric) if metric != 'results_time' else response_body.get(metric)
+                    times[metric].append(np.nan if value is None else value)
+            arrays = {metric: np.asarray(values, dtype=np.float64) for metric, values in times.items()}
+        except (AttributeError, TypeError, ValueError) as e:  # json.JSONDecodeError is a ValueError
+            print(f"Error {e} in file {path}, skipping it")
+            continue
+        frames.append(_long_frame(provider, memory, arrays))
+    return _finish_frame(frames)
+
+
+def read_store_frame(base_path, function, runtime):
+    """Load only the plotted columns and the rows of one function and runtime from the columnar store."""
+    frames = []
+    table = load_results(base_path, columns=["provider", "memory", *METRICS], filter=ds.field("error").is_null(),
+                         benchmark=function, runtime=runtime)
+    for batch in table.to_batches():
+        if batch.num_rows == 0:
+            continue
+        batch_df = batch.to_pandas()
+        for (provider, memory), group in batch_df.groupby([batch_df["provider"], batch_df["memory"].map(memory_label)],
+                                                          sort=False, observed=True):
+            frames.append(_long_frame(provider, memory, {metric: group[metric].to_numpy(dtype=np.float64)
+                                                         for metric in METRICS}))
+    return _finish_frame(frames)
+
+
+def create_boxplot(df, func, execution_type, plot_file):
+    """Boxplots of the times of one function and runtime, per memory configuration of every provider."""
+    df = df.assign(Configuration=pd.Categorical(
+        df['Memory'].astype(str) + " (" + df['Provider'].astype(str) + ")",
+        categories=[f"{mem} ({prov})" for prov in df['Provider'].cat.categories
+                    for mem in df['Memory'].cat.categories]))
+    configurations = df['Configuration'].cat.remove_unused_categories().cat.categories
+    providers = [configuration.rsplit(" (", 1)[1][:-1] for configuration in configurations]
+
+    plt.figure(figsize=(16, 10))
+
+    flierprops = dict(marker='D', markerfacecolor='grey', markeredgecolor='grey', markersize=5, linestyle='none')
+
+    ax = sns.boxplot(x='Configuration', y='Time', hue='TimeType', data=df, order=list(configurations),
+                     hue_order=list(METRICS), palette='pastel', flierprops=flierprops)
+
+    plt.yscale('log')
+    ax.yaxis.set_major_formatter(LogFormatter(base=10.0))
+
+    for idx in range(1, len(providers)):
+        if providers[idx] != providers[idx - 1]:
+            plt.axvline(idx - 0.5, color='grey', linestyle='--')
+
+    plt.title(f'{func} - {execution_type.upper()} Execution Times by Memory and Provider')
+    plt.xlabel('Memory (MB) - Provider')
+    plt.ylabel('Time (s)')
+    plt.legend(title='Time Type', loc='upper right')
+    plt.xticks(rotation=45)
+    plt.grid(True)
+
+    plt.savefig(plot_file, bbox_inches='tight')
+    plt.close()
+
+
+def render_figure(base_path, func, execution_type, figure, plot_file):
+    """Read the inputs of one figure and render it, runs in a worker process. Returns False if there is no data."""
+    if figure['source'] == 'store':
+        df = read_store_frame(base_path, func, execution_type)
+    else:
+        df = read_files_frame(figure['files'])
+    if df.empty:
+        return False
+    create_boxplot(df, func, execution_type, plot_file)
+    return True
+
 
 def main():
     base_path = 'benchmark_results'
     output_dir = 'benchmark_plots'
     os.makedirs(output_dir, exist_ok=True)
 
-    data = read_json_files(base_path)
-    if not data:
+    figures = find_figures(base_path)
+    if not figures:
         print("No data found.")
         return
-    create_boxplots(data, output_dir)
+
+    state = load_render_state(output_dir)
+    jobs = []
+    for (func, execution_type), figure in sorted(figures.items()):
+        plot_name = f'{func}_{execution_type}_boxplots.png'
+        figure_fingerprint = fingerprint(figure)
+        if state.get(plot_name) == figure_fingerprint and os.path.exists(os.path.join(output_dir, plot_name)):
+            print(f"Skipping {plot_name}, its results did not change since the last render")
+            continue
+        jobs.append((func, execution_type, figure, plot_name, figure_fingerprint))
+    if not jobs:
+        return
+
+    with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as pool:
+        futures = {pool.submit(render_figure, base_path, func, execution_type, figure,
+                               os.path.join(output_dir, plot_name)): (plot_name, figure_fingerprint)
+                   for func, execution_type, figure, plot_name, figure_fingerprint in jobs}
+        for future in as_completed(futures):
+            plot_name, figure_fingerprint = futures[future]
+            try:
+                rendered = future.result()
+            except Exception as e:
+                print(f"Error {e} while rendering {plot_name}")
+                continue
+            if rendered:
+                print(f"Plot saved to {os.path.join(output_dir, plot_name)}")
+            else:
+                print(f"No data found for {plot_name}")
+            # Saved after every figure, so an interrupted render keeps the figures that completed
+            state[plot_name] = figure_fingerprint
+            save_render_state(output_dir, state)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
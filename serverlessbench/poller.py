@@ -0,0 +1,116 @@
+import random
+import statistics
+import threading
+import time
+from typing import Callable, List, Optional
+
+from serverlessbench.logger import LoggingBase
+
+
+class PollResult:
+    def __init__(self, resolved: int, expected: int, attempts: int, elapsed: float, lag: Optional[float]):
+        self.resolved = resolved
+        self.expected = expected
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.lag = lag  # Seconds between the end of the queried window and the moment everything was resolved
+
+    @property
+    def complete(self) -> bool:
+        return self.resolved >= self.expected
+
+
+class ReadinessPoller(LoggingBase):
+    """
+    Polls a provider's logs until every request id of a window is resolved.
+    The first query is sent right away, then the wait between queries grows exponentially with jitter up to
+    `max_interval`. Polling stops as soon as everything is resolved or after `deadline` seconds.
+    The observed log ingestion lags are kept, so callers can schedule their next query at the typical lag instead of
+    a worst-case sleep. A lag is only observed once everything is resolved, which overstates it by the time since the
+    logs became complete, so the schedule follows a separate estimate that can also come down again.
+    """
+
+    def __init__(self, provider: str, initial_interval: float = 1.0, max_interval: float = 30.0, factor: float = 2.0,
+                 jitter: float = 0.2, deadline: float = 600.0, lag_decay: float = 0.8):
+        super().__init__()
+        self.provider = provider
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.deadline = deadline
+        self.lag_decay = lag_decay
+        self.observed_lags: List[float] = []
+        self._lag_estimate: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def poll(self, query: Callable[[], int], expected: int, window_end: float) -> PollResult:
+        """
+        Call `query` (returning the number of resolved request ids) until it returns at least `expected`.
+        `window_end` is the epoch time the last queried invocation finished, used to measure the ingestion lag.
+        """
+        start = time.monotonic()
+        interval = self.initial_interval
+        attempts = 0
+        resolved = 0
+        last_miss = None
+
+        while True:
+            attempts += 1
+            queried_at = time.time()
+            resolved = query()
+            if resolved >= expected:
+                lag = max(0.0, time.time() - window_end)
+                with self._lock:
+                    self.observed_lags.append(lag)
+                    self._update_lag_estimate(window_end, queried_at, last_miss)
+                self.logging.info(
+                    f"{self.provider.upper()}: resolved all {expected} invocations after {attempts} queries, "
+                    f"observed log ingestion lag {lag:.1f}s.")
+                return PollResult(resolved, expected, attempts, time.monotonic() - start, lag)
+
+            remaining = self.deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                self.logging.warning(
+                    f"{self.provider.upper()}: resolved only {resolved} out of {expected} invocations before the "
+                    f"{self.deadline:.0f}s deadline.")
+                return PollResult(resolved, expected, attempts, time.monotonic() - start, None)
+            last_miss = queried_at
+
+            wait = min(remaining, interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+            self.logging.info(
+                f"{self.provider.upper()}: resolved {resolved} out of {expected} invocations, querying again in "
+                f"{wait:.1f}s.")
+            time.sleep(wait)
+            interval = min(self.max_interval, interval * self.factor)
+
+    def _update_lag_estimate(self, window_end: float, queried_at: float, last_miss: Optional[float]):
+        """
+        The logs became complete between the last query that missed some of them and the one that resolved them.
+        After a miss the estimate moves half way up to the time of the miss, so a single slow window doesn't delay
+        all others. Without a miss the logs may have been complete much earlier, so the estimate is lowered and the
+        next window is tried earlier.
+        """
+        if last_miss is not None:
+            lower_bound = max(0.0, last_miss - window_end)
+            if self._lag_estimate is None:
+                self._lag_estimate = lower_bound
+            else:
+                self._lag_estimate += (lower_bound - self._lag_estimate) / 2
+        else:
+            upper_bound = max(0.0, queried_at - window_end)
+            self._lag_estimate = min(self._lag_estimate if self._lag_estimate is not None else upper_bound,
+                                     upper_bound) * self.lag_decay
+
+    def expected_lag(self) -> float:
+        """Estimated ingestion lag to wait for before the first query of a window, 0 before anything was observed."""
+        with self._lock:
+            return self._lag_estimate if self._lag_estimate is not None else 0.0
+
+    def report(self) -> Optional[str]:
+        with self._lock:
+            lags = list(self.observed_lags)
+        if not lags:
+            return None
+        return (f"{self.provider.upper()}: log ingestion lag over {len(lags)} windows: "
+                f"median {statistics.median(lags):.1f}s, max {max(lags):.1f}s.")
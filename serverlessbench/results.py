@@ -0,0 +1,116 @@
+import json
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+from serverlessbench.logger import LoggingBase
+
+# Per-target summaries written next to the results files
+SUMMARY_SUFFIXES = ('_bursts.json', '_cold_stats.json', '_histogram.json', '_lifecycle.json')
+
+
+class ResultWriter(LoggingBase):
+    """
+    Appends invocation records to a JSONL file, one record per line, as soon as they are handed over.
+    Writing happens on a background thread, so invokers (including the asyncio event loop) never block on disk I/O.
+    The file is flushed whenever the queue runs empty and fsynced every `checkpoint_every` records and on close,
+    so a crashed run loses at most the records since the last checkpoint.
+    """
+
+    _CHECKPOINT = {}  # Queue marker requesting an fsync
+
+    def __init__(self, path: str, checkpoint_every: int = 1000, append: bool = False):
+        super().__init__()
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.records_written = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._file = open(path, 'a' if append else 'w')
+        self._thread = threading.Thread(target=self._run, name='ResultWriter', daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]):
+        """Queue a record for writing. Thread-safe and non-blocking."""
+        self._queue.put(record)
+
+    def checkpoint(self):
+        """Block until every queued record is written and fsynced."""
+        self._queue.put(self._CHECKPOINT)
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:
+                    return
+                if record is self._CHECKPOINT:
+                    self._sync()
+                    continue
+                self._file.write(json.dumps(record, sort_keys=True) + '\n')
+                self.records_written += 1
+                if self.records_written % self.checkpoint_every == 0:
+                    self._sync()
+                elif self._queue.empty():
+                    self._file.flush()
+            finally:
+                self._queue.task_done()
+
+
+def read_results(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the records of a JSONL results file. A truncated last line (e.g. after a crash) is skipped."""
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def patch_results(path: str, updates: Dict[str, Dict[str, Any]]):
+    """
+    Merge `updates` (fields by request id) into the records of a JSONL results file.
+    The file is rewritten line by line into a temporary file that atomically replaces the original, so only one
+    record is held in memory at a time and an interrupted patch leaves the original untouched.
+    """
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as out:
+        for record in read_results(path):
+            record.update(updates.get(record.get('request_id'), {}))
+            out.write(json.dumps(record, sort_keys=True) + '\n')
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temp_path, path)
+
+
+def truncate_results(path: str, count: int):
+    """Keep only the first `count` records of a JSONL results file, e.g. those confirmed by a run manifest."""
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as out:
+        for index, record in enumerate(read_results(path)):
+            if index >= count:
+                break
+            out.write(json.dumps(record, sort_keys=True) + '\n')
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temp_path, path)
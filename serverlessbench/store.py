@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from serverlessbench.logger import LoggingBase
+from serverlessbench.results import read_results
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+STORE_DIR = 'store'
+CATALOG_FILE = 'catalog.json'
+
+# Columns of every results table, the run metadata is repeated per row so files of different runs can be scanned
+# as one dataset
+SCHEMA = pa.schema([
+    ('run_id', pa.string()),
+    ('provider', pa.string()),
+    ('runtime', pa.string()),
+    ('benchmark', pa.string()),
+    ('load_profile', pa.string()),
+    ('memory', pa.int32()),  # null for providers without configurable memory (Azure)
+    ('request_id', pa.string()),
+    ('client_begin', pa.int64()),  # wall-clock microseconds
+    ('client_end', pa.int64()),
+    ('client_time', pa.float64()),  # seconds
+    ('provider_time', pa.float64()),
+    ('results_time', pa.float64()),
+    ('is_cold', pa.bool_()),
+    ('container_id', pa.string()),
+    ('burst', pa.int32()),  # null outside of the BURST profile
+    ('cold_attempts', pa.int32()),  # invocations needed to get the cold sample, null outside of the COLD profile
+    ('status_code', pa.int32()),  # null if no response was received
+    ('error', pa.string()),  # null for successful invocations, also in files written before the column existed
+]) if pa is not None else None
+
+
+def _to_row(record: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    response_body = record.get('response_body')
+    if not isinstance(response_body, dict):
+        response_body = {}  # Non-JSON responses, e.g. error pages
+    return dict(metadata,
+                request_id=record.get('request_id'),
+                client_begin=record.get('client_begin'),
+                client_end=record.get('client_end'),
+                client_time=record.get('client_time'),
+                provider_time=record.get('provider_time'),
+                results_time=response_body.get('results_time'),
+                is_cold=response_body.get('is_cold'),
+                container_id=response_body.get('container_id'),
+                burst=record.get('burst'),
+                cold_attempts=record.get('cold_attempts'),
+                status_code=record.get('status_code'),
+                error=record.get('error'))
+
+
+class ResultStore(LoggingBase):
+    """
+    Columnar copy of the JSONL results, one Parquet file per results file, indexed by a catalog of runs.
+    The catalog lists every file with its run metadata and row count, so readers select the files of interest without
+    opening them and only scan the columns and rows they need.
+    If pyarrow is not installed, the store is disabled and the JSONL files remain the only results.
+    """
+
+    def __init__(self, results_root: str, batch_size: int = 10000):
+        super().__init__()
+        self.root = os.path.join(results_root, STORE_DIR)
+        self.batch_size = batch_size
+        self.enabled = pa is not None
+        self._lock = threading.Lock()
+        if not self.enabled:
+            self.logging.warning('pyarrow is not installed, results are only kept as JSONL files.')
+
+    def add(self, results_file: str, run_id: str, provider: str, runtime: str, benchmark: str, load_profile: str,
+            memory: Optional[int]):
+        """Convert a (fully enriched) JSONL results file and register it in the catalog."""
+        if not self.enabled:
+            return
+        metadata = {'run_id': run_id, 'provider': provider, 'runtime': runtime, 'benchmark': benchmark,
+                    'load_profile': load_profile, 'memory': memory}
+        file_name = f'{provider}_{runtime}_{benchmark}_{load_profile}_{memory if memory else "default"}.parquet'
+        path = os.path.join(self.root, run_id, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Converted in batches, so memory use doesn't grow with the size of the results file
+        rows = 0
+        with pq.ParquetWriter(path, SCHEMA) as writer:
+            batch = []
+            for record in read_results(results_file):
+                batch.append(_to_row(record, metadata))
+                if len(batch) >= self.batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=SCHEMA))
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=SCHEMA))
+                rows += len(batch)
+
+        with self._lock:
+            catalog = load_catalog(os.path.dirname(self.root))
+            catalog = [entry for entry in catalog if entry['path'] != os.path.relpath(path, self.root)]
+            catalog.append(dict(metadata, path=os.path.relpath(path, self.root), rows=rows,
+                                source=os.path.relpath(results_file, os.path.dirname(self.root)),
+                                created=time.time()))
+            self._save_catalog(catalog)
+
+    def _save_catalog(self, catalog: List[Dict[str, Any]]):
+        temp_path = os.path.join(self.root, f'{CATALOG_FILE}.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(catalog, f, indent=4)
+        os.replace(temp_path, os.path.join(self.root, CATALOG_FILE))
+
+
+def load_catalog(results_root: str) -> List[Dict[str, Any]]:
+    """Entries of the run catalog, empty if nothing was stored yet."""
+    path = os.path.join(results_root, STORE_DIR, CATALOG_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def select_files(results_root: str, **criteria) -> Iterator[str]:
+    """Paths of the stored files whose catalog entry matches every criterion, e.g. provider='aws', run_id=..."""
+    for entry in load_catalog(results_root):
+        if all(entry.get(key) == value for key, value in criteria.items()):
+            yield os.path.join(results_root, STORE_DIR, entry['path'])
+
+
+def load_results(results_root: str, columns: Optional[List[str]] = None, filter=None, **criteria):
+    """
+    Load stored invocations as a pyarrow Table.
+    `criteria` select files through the catalog, `filter` is a pyarrow.dataset expression pushed down into the scan
+    (e.g. `pyarrow.dataset.field('is_cold') == True`), `columns` limits the columns that are read.
+    """
+    if pa is None:
+        raise ImportError('pyarrow is required to load the columnar results store.')
+    paths = list(select_files(results_root, **criteria))
+    if not paths:
+        return SCHEMA.empty_table() if columns is None else SCHEMA.empty_table().select(columns)
+    return ds.dataset(paths, schema=SCHEMA, format='parquet').to_table(columns=columns, filter=filter)
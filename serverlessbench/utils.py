@@ -1,9 +1,26 @@
+import copy
 import json
 import os
 import subprocess
 import hashlib
 import platform
-from typing import Dict, Any, List
+import threading
+from typing import Dict, Any, List, Tuple
+
+# Parsed JSON files by absolute path, together with the (mtime, size) they were read at
+_json_cache: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+_json_cache_lock = threading.Lock()
+
+# Held around every read-modify-write of deployments.json and cache.json, so parallel deploys don't lose entries
+deployments_lock = threading.RLock()
+cache_lock = threading.RLock()
+
+BUILD_CACHE_DIR = 'build_cache'
+# SHA-256 of every hashed file by absolute path, with the (size, mtime_ns, inode) it was computed for
+DIGESTS_FILE = os.path.join(BUILD_CACHE_DIR, 'digests.json')
+_digests: Dict[str, List] = {}
+_digests_loaded = False
+_digests_lock = threading.Lock()
 
 
 def execute(cmd, errorMessage=None, logger=None, cwd=None, disableCmdLog=False, env=None) -> str:
@@ -28,14 +45,37 @@ def execute(cmd, errorMessage=None, logger=None, cwd=None, disableCmdLog=False,
     return ret.stdout.decode("utf-8")
 
 
+def _load_json_cached(path: str):
+    """
+    Load a JSON file, served from memory as long as its mtime and size didn't change.
+    Callers get their own deep copy, so they may modify it before saving it back.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _json_cache_lock:
+        cached = _json_cache.get(path)
+        if cached is None or cached[0] != version:
+            with open(path, 'r') as file:
+                cached = _json_cache[path] = (version, json.load(file))
+        return copy.deepcopy(cached[1])
+
+
+def _save_json_cached(path: str, data):
+    path = os.path.abspath(path)
+    with _json_cache_lock:
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=4)
+        stat = os.stat(path)
+        _json_cache[path] = ((stat.st_mtime_ns, stat.st_size), copy.deepcopy(data))
+
+
 def load_config():
-    with open('config.json', 'r') as file:
-        return json.load(file)
+    return _load_json_cached('config.json')
 
 
 def save_config(config):
-    with open('config.json', 'w') as file:
-        json.dump(config, file, indent=4)
+    _save_json_cached('config.json', config)
 
 
 def clean_json_output(output):
@@ -56,8 +96,7 @@ def clean_json_output(output):
 
 
 def save_deployments(deployments):
-    with open('deployments.json', 'w') as file:
-        json.dump(deployments, file, indent=4)
+    _save_json_cached('deployments.json', deployments)
 
 
 def get_benchmark_names() -> List[str]:
@@ -81,45 +120,99 @@ def load_deployments():
     if not os.path.exists(path):
         with open(path, 'w') as file:
             json.dump({}, file)
-    with open(path, 'r') as file:
-        return json.load(file)
+    return _load_json_cached(path)
 
 def find_deployment(benchmark_name: str, provider: str, native: bool):
-    deployments = load_deployments()
-    if provider not in deployments:
-        deployments[provider] = {}
-    if native:
-        if "native" not in deployments[provider]:
-            deployments[provider]["native"] = {}
-        if benchmark_name not in deployments[provider]["native"]:
-            deployments[provider]["native"][benchmark_name] = {}
-            save_deployments(deployments)
-            return None
-        if deployments[provider]["native"][benchmark_name].get('function_name') is None:
-            return None
-        return deployments[provider]["native"][benchmark_name]
-    else:
-        if "jvm" not in deployments[provider]:
-            deployments[provider]["jvm"] = {}
-        if benchmark_name not in deployments[provider]["jvm"]:
-            deployments[provider]["jvm"][benchmark_name] = {}
-            save_deployments(deployments)
-            return None
-        if deployments[provider]["jvm"][benchmark_name].get('function_name') is None:
-            return None
-        return deployments[provider]["jvm"][benchmark_name]
+    with deployments_lock:
+        deployments = load_deployments()
+        if provider not in deployments:
+            deployments[provider] = {}
+        if native:
+            if "native" not in deployments[provider]:
+                deployments[provider]["native"] = {}
+            if benchmark_name not in deployments[provider]["native"]:
+                deployments[provider]["native"][benchmark_name] = {}
+                save_deployments(deployments)
+                return None
+            if deployments[provider]["native"][benchmark_name].get('function_name') is None:
+                return None
+            return deployments[provider]["native"][benchmark_name]
+        else:
+            if "jvm" not in deployments[provider]:
+                deployments[provider]["jvm"] = {}
+            if benchmark_name not in deployments[provider]["jvm"]:
+                deployments[provider]["jvm"][benchmark_name] = {}
+                save_deployments(deployments)
+                return None
+            if deployments[provider]["jvm"][benchmark_name].get('function_name') is None:
+                return None
+            return deployments[provider]["jvm"][benchmark_name]
+
+
+def compute_file_digest(file_path) -> str:
+    hash_obj = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            hash_obj.update(chunk)
+    return hash_obj.hexdigest()
 
 
-def compute_directory_hash(directory_path):
-    hash_obj = hashlib.sha256()
+def _load_digests():
+    global _digests, _digests_loaded
+    if not _digests_loaded:
+        if os.path.exists(DIGESTS_FILE):
+            with open(DIGESTS_FILE, 'r') as file:
+                _digests = json.load(file)
+        _digests_loaded = True
+
+
+def _save_digests():
+    os.makedirs(BUILD_CACHE_DIR, exist_ok=True)
+    temp_path = f'{DIGESTS_FILE}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(_digests, file)
+    os.replace(temp_path, DIGESTS_FILE)
+
+
+def list_directory_digests(directory_path) -> List[Tuple[str, str]]:
+    """
+    (relative path, SHA-256) of every file below a directory, in a stable order.
+    Files whose size, mtime and inode didn't change since they were last hashed aren't read again.
+    """
+    directory_path = os.path.abspath(directory_path)
+    entries = []
+    with _digests_lock:
+        _load_digests()
+        known = dict(_digests)
 
+    fresh = {}
     for root, dirs, files in os.walk(directory_path):
+        dirs.sort()
         for file_name in sorted(files):
             file_path = os.path.join(root, file_name)
-            with open(file_path, 'rb') as f:
-                while chunk := f.read(8192):
-                    hash_obj.update(chunk)
+            stat = os.stat(file_path)
+            key = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+            cached = known.get(file_path)
+            digest = cached[3] if cached is not None and cached[:3] == key else compute_file_digest(file_path)
+            fresh[file_path] = key + [digest]
+            entries.append((os.path.relpath(file_path, directory_path).replace(os.sep, '/'), digest))
+
+    with _digests_lock:
+        prefix = directory_path + os.sep
+        changed = fresh != {path: entry for path, entry in _digests.items() if path.startswith(prefix)}
+        if changed:
+            # Forget deleted files of this directory
+            for path in [path for path in _digests if path.startswith(prefix) and path not in fresh]:
+                del _digests[path]
+            _digests.update(fresh)
+            _save_digests()
+    return entries
 
+
+def compute_directory_hash(directory_path):
+    hash_obj = hashlib.sha256()
+    for relative_path, digest in list_directory_digests(directory_path):
+        hash_obj.update(f'{relative_path}\0{digest}\n'.encode('utf-8'))
     return hash_obj.hexdigest()
 
 
@@ -138,48 +231,53 @@ def save_cache(cache):
 
 
 def find_cache(provider, benchmark_name, native):
-    cache = load_cache()
-    if provider not in cache:
-        cache[provider] = {}
-    if native:
-        if "native" not in cache[provider]:
-            cache[provider]["native"] = {}
-        if benchmark_name not in cache[provider]["native"]:
-            cache[provider]["native"][benchmark_name] = {}
-            save_cache(cache)
-            return None
-        if cache[provider]["native"][benchmark_name].get('src_hash') is None:
-            return None
-        return cache[provider]["native"][benchmark_name]
-    else:
-        if "jvm" not in cache[provider]:
-            cache[provider]["jvm"] = {}
-        if benchmark_name not in cache[provider]["jvm"]:
-            cache[provider]["jvm"][benchmark_name] = {}
-            save_cache(cache)
-            return None
-        if cache[provider]["jvm"][benchmark_name].get('src_hash') is None:
-            return None
-        return cache[provider]["jvm"][benchmark_name]
+    with cache_lock:
+        cache = load_cache()
+        if provider not in cache:
+            cache[provider] = {}
+        if native:
+            if "native" not in cache[provider]:
+                cache[provider]["native"] = {}
+            if benchmark_name not in cache[provider]["native"]:
+                cache[provider]["native"][benchmark_name] = {}
+                save_cache(cache)
+                return None
+            if cache[provider]["native"][benchmark_name].get('src_hash') is None:
+                return None
+            return cache[provider]["native"][benchmark_name]
+        else:
+            if "jvm" not in cache[provider]:
+                cache[provider]["jvm"] = {}
+            if benchmark_name not in cache[provider]["jvm"]:
+                cache[provider]["jvm"][benchmark_name] = {}
+                save_cache(cache)
+                return None
+            if cache[provider]["jvm"][benchmark_name].get('src_hash') is None:
+                return None
+            return cache[provider]["jvm"][benchmark_name]
 
 
 def update_cache(provider, benchmark_name, native, src_hash, target_hash, image_hash=None):
-    cache = load_cache()
-    if provider not in cache:
-        cache[provider] = {}
-    if native:
-        if "native" not in cache[provider]:
-            cache[provider]["native"] = {}
-        cache[provider]["native"][benchmark_name]["src_hash"] = src_hash
-        cache[provider]["native"][benchmark_name]["target_hash"] = target_hash
-    else:
-        if "jvm" not in cache[provider]:
-            cache[provider]["jvm"] = {}
-        cache[provider]["jvm"][benchmark_name]["src_hash"] = src_hash
-        cache[provider]["jvm"][benchmark_name]["target_hash"] = target_hash
-    if image_hash:
-        cache[provider]["native" if native else "jvm"][benchmark_name]["image_hash"] = image_hash
-    save_cache(cache)
+    with cache_lock:
+        cache = load_cache()
+        if provider not in cache:
+            cache[provider] = {}
+        entry = cache[provider].get("native" if native else "jvm", {}).get(benchmark_name, {})
+        if entry.get("target_hash") != target_hash:
+            entry.pop("image_hash", None)  # The image was built from the previous build output
+        if native:
+            if "native" not in cache[provider]:
+                cache[provider]["native"] = {}
+            cache[provider]["native"][benchmark_name]["src_hash"] = src_hash
+            cache[provider]["native"][benchmark_name]["target_hash"] = target_hash
+        else:
+            if "jvm" not in cache[provider]:
+                cache[provider]["jvm"] = {}
+            cache[provider]["jvm"][benchmark_name]["src_hash"] = src_hash
+            cache[provider]["jvm"][benchmark_name]["target_hash"] = target_hash
+        if image_hash:
+            cache[provider]["native" if native else "jvm"][benchmark_name]["image_hash"] = image_hash
+        save_cache(cache)
 
 
 def calculate_cpu(memory_mib):
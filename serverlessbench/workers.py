@@ -0,0 +1,179 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from serverlessbench.histogram import LatencyHistogram
+from serverlessbench.invoker import BurstResultCallback, FunctionInvocationResult, Invoker, ResultCallback, \
+    create_invoker
+
+# Set in every worker process by the pool initializer
+_start_barrier = None
+_result_queue = None
+
+BARRIER_TIMEOUT = 300  # seconds to wait for all workers to be ready
+RESULT_POLL_INTERVAL = 0.5  # seconds between checks for crashed workers while waiting for results
+
+
+def _init_worker(barrier, result_queue):
+    global _start_barrier, _result_queue
+    _start_barrier = barrier
+    _result_queue = result_queue
+
+
+def _pin_to_cpu(index: int):
+    """Pin the calling process to one of the CPUs it is allowed to run on (Linux only)."""
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+
+
+def _run_share(index: int, engine: str, max_connections: int, method_name: str,
+               kwargs: Optional[Dict[str, Any]]) -> Optional[LatencyHistogram]:
+    """
+    Entry point of a worker process: run its share of the invocation plan once all workers are ready.
+    Every result is put on the result queue as soon as it arrives, followed by a (index, None) marker once the share
+    is done. Returns the histogram the worker counted the results in.
+    """
+    _pin_to_cpu(index)
+    invoker = create_invoker(engine, max_connections=max_connections)
+    try:
+        _start_barrier.wait(timeout=BARRIER_TIMEOUT)
+        if kwargs is None:
+            return None
+        if method_name == 'run_schedule':
+            kwargs['on_result'] = lambda burst, result: _result_queue.put((index, (burst, result)))
+        else:
+            kwargs['on_result'] = lambda result: _result_queue.put((index, result))
+        getattr(invoker, method_name)(**kwargs)
+        return kwargs.get('histogram')
+    finally:
+        invoker.close()
+        _result_queue.put((index, None))
+
+
+def split_evenly(total: int, parts: int) -> List[int]:
+    """Split `total` into `parts` integers that differ by at most one."""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+class MultiProcessInvoker(Invoker):
+    """
+    Splits the WARM and BURST invocation plans across a pool of worker processes, each pinned to its own CPU and
+    running its own invocation engine, so load generation is not limited by the GIL of a single process.
+    All workers wait on a shared barrier before sending their first request, so their timestamps line up.
+    Single invocations (COLD) stay in the calling process. Workers stream their results back over a queue, the
+    calling process hands every result to the result callback as it arrives, so the parent holds no results and a
+    crash only loses those still in flight.
+    """
+
+    def __init__(self, workers: int, engine: str = 'sync', max_connections: int = 1):
+        super().__init__()
+        self.workers = workers
+        self.engine = engine
+        self.max_connections = max_connections
+        self.local_invoker = create_invoker(engine, max_connections=max_connections)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._result_queue = None
+        # Parallel targets share the pool, their plans must not mix at the start barrier
+        self._run_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned workers don't inherit open gRPC channels and event loops of the parent
+            context = multiprocessing.get_context('spawn')
+            self._result_queue = context.Queue()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                             initargs=(context.Barrier(self.workers), self._result_queue))
+        return self._pool
+
+    def _run(self, method_name: str, shares: List[Optional[Dict[str, Any]]], histogram: Optional[LatencyHistogram],
+             on_result: Callable[[Any], None]):
+        """Run the shares in the worker processes, calling `on_result` with every result they send back."""
+        if histogram is not None:
+            # Every worker counts into its own empty copy, the copies are merged afterwards
+            for share in shares:
+                if share is not None:
+                    share['histogram'] = histogram.empty_copy()
+        with self._run_lock:
+            pool = self._get_pool()
+            connections = split_evenly(self.max_connections, self.workers)
+            futures = [pool.submit(_run_share, index, self.engine, max(1, connections[index]), method_name, share)
+                       for index, share in enumerate(shares)]
+
+            running = len(futures)
+            while running:
+                try:
+                    index, result = self._result_queue.get(timeout=RESULT_POLL_INTERVAL)
+                except queue.Empty:
+                    # A worker that died without its done marker would otherwise be waited for forever
+                    for future in futures:
+                        if future.done() and future.exception() is not None:
+                            raise future.exception()
+                    continue
+                if result is None:
+                    running -= 1
+                else:
+                    on_result(result)
+
+            for future in futures:
+                worker_histogram = future.result()
+                if histogram is not None and worker_histogram is not None:
+                    histogram.merge(worker_histogram)
+
+    def invoke(self, provider: str, url: str, method: str,
+               request_body: Optional[dict]) -> FunctionInvocationResult:
+        return self.local_invoker.invoke(provider=provider, url=url, method=method, request_body=request_body)
+
+    def run_closed_loop(self, provider: str, url: str, method: str, request_body: Optional[dict], repetitions: int,
+                        warmup: int, concurrency: int, duration: Optional[float],
+                        on_result: Optional[ResultCallback] = None,
+                        histogram: Optional[LatencyHistogram] = None) -> List[FunctionInvocationResult]:
+        shares = []
+        for worker_repetitions, worker_warmup, worker_concurrency in zip(split_evenly(repetitions, self.workers),
+                                                                         split_evenly(warmup, self.workers),
+                                                                         split_evenly(concurrency, self.workers)):
+            if worker_concurrency == 0 or (worker_repetitions == 0 and not duration):
+                shares.append(None)
+                continue
+            shares.append({'provider': provider, 'url': url, 'method': method, 'request_body': request_body,
+                           'repetitions': worker_repetitions, 'warmup': worker_warmup,
+                           'concurrency': worker_concurrency, 'duration': duration})
+
+        self.logging.info(f"Splitting {concurrency} concurrent workers across {self.workers} processes.")
+        results = []
+        self._run('run_closed_loop', shares, histogram, on_result if on_result is not None else results.append)
+        return results
+
+    def run_schedule(self, provider: str, url: str, method: str, request_body: Optional[dict],
+                     schedule: List[Tuple[float, int, int]],
+                     on_result: Optional[BurstResultCallback] = None,
+                     histogram: Optional[LatencyHistogram] = None) -> List[Tuple[int, FunctionInvocationResult]]:
+        worker_schedules = [[] for _ in range(self.workers)]
+        next_worker = 0
+        for offset, burst, size in schedule:
+            # Spread every burst across all workers and rotate single arrivals, so each worker gets a fair share
+            for i, worker_size in enumerate(split_evenly(size, self.workers)):
+                if worker_size:
+                    worker_schedules[(next_worker + i) % self.workers].append((offset, burst, worker_size))
+            next_worker = (next_worker + size) % self.workers
+
+        shares = [{'provider': provider, 'url': url, 'method': method, 'request_body': request_body,
+                   'schedule': worker_schedule} if worker_schedule else None
+                  for worker_schedule in worker_schedules]
+
+        self.logging.info(f"Splitting {len(schedule)} arrivals across {self.workers} processes.")
+        results = []
+        self._run('run_schedule', shares, histogram,
+                  (lambda pair: on_result(*pair)) if on_result is not None else results.append)
+        return results
+
+    def close(self):
+        self.local_invoker.close()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._result_queue = None